@@ -0,0 +1,58 @@
+#  DEMO script (python version) for pyseisdl
+#
+#  Copyright (C) 2026 pyseisdl developing team
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details: http://www.gnu.org/licenses/
+#
+## Benchmark of the single-atom (T=1) sparse coding used in the SGK training iterations
+# loop: column-by-column omp_e (the original ompN(D,X,1))
+# omp1: vectorized coder (one D^TX product and one argmax)
+import numpy as np
+import pyseisdl as dl #dl: dictionary learning
+from pyseisdl.sgk import omp_e
+from pyseisdl.patch import patch2d
+import time
+
+## generate a simple synthetic section with three dipping events
+n1=400;n2=200;
+t=np.arange(n1)[:,None];x=np.arange(n2)[None,:];
+dc=np.zeros([n1,n2]);
+for t0,p in [(100,0.3),(200,-0.2),(300,0.0)]:
+	tau=t-t0-p*x;
+	dc=dc+(1-2*(np.pi*0.05*tau)**2)*np.exp(-(np.pi*0.05*tau)**2);
+np.random.seed(202122);
+dn=dc+0.2*np.random.randn(n1,n2);
+
+## patches and the initial DCT-like dictionary (16x64)
+l1=4;l2=4;s1=2;s2=2;c1=8;c2=8;
+X=patch2d(dn,l1,l2,s1,s2,1).T;
+dct1=np.cos(np.arange(l1)[:,None]*np.arange(c1)[None,:]*np.pi/c1);
+dct1[:,1:]=dct1[:,1:]-np.mean(dct1[:,1:],0);dct1=dct1/np.linalg.norm(dct1,axis=0);
+dct2=np.cos(np.arange(l2)[:,None]*np.arange(c2)[None,:]*np.pi/c2);
+dct2[:,1:]=dct2[:,1:]-np.mean(dct2[:,1:],0);dct2=dct2/np.linalg.norm(dct2,axis=0);
+D=np.kron(dct1,dct2);
+print('Number of patches: %d, dictionary size: %dx%d'%(X.shape[1],D.shape[0],D.shape[1]));
+
+## loop over columns
+t1=time.time();
+G0=np.zeros([D.shape[1],X.shape[1]]);
+for i2 in range(0,X.shape[1]):
+	G0[:,i2]=omp_e(D,X[:,i2]);
+t2=time.time();
+print('Column loop (omp_e) takes %.3g seconds'%(t2-t1));
+
+## vectorized
+t1=time.time();
+G1=dl.omp1(D,X);
+t2=time.time();
+print('Vectorized (omp1) takes %.3g seconds'%(t2-t1));
+
+print('Maximum coefficient difference: %g'%np.max(np.abs(G0-G1)));
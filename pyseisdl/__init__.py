@@ -13,8 +13,16 @@ __version__ = "0.0.2"
 
 from .ksvd import ksvd, fast_ksvd
 from .sgk import sgk
+from .online import odl
+from .omp import batch_omp, omp1
+from .store import store_key, store_load, store_save
+from .dictionary import KronDict, SparseDict, sparse_dict, dct_dict, GramDict
 from .denoise import sgk_denoise
 from .denoise import ksvd_denoise, fast_ksvd_denoise
+from .denoise import dct_denoise
+from .patch import patchnd, patchnd_inv, PatchGeometry, patch_geometry
+from .tiled import tiled_denoise
+from .engine import DLEngine, DLModel
 from .snr import snr
 
 
@@ -21,13 +21,28 @@ def sgk_denoise(din,mode,l,s,perc,param):
 	  param: parameter struct for DL
 	  param.mode=1;   	#1: sparsity; 0: error
 	  param.niter=10; 	#number of K-SVD iterations to perform; default: 10
-	  param.D=DCT;    	#initial D
+	  param.D=DCT;    	#initial D (dense, or a KronDict/SparseDict, densified for learning)
+	  param.structured=0;	#1: build the initial DCT dictionary as a KronDict (see dct_dict)
 	  param.T=3;      	#sparsity level
+	  param.sparse=0;	#1: keep the coefficients as a scipy.sparse matrix
+	  param.n_jobs=1;	#processes for the sparse coding (-1: all cores)
+	  param.dtype=np.float32;	#work (patches, D, G, output) in single precision
+	  param.tol=tol;		#stop the learning early (see sgk)
+	  param.history=0;	#1: also return the per-iteration history (hist)
+	  param.train_fraction=1;	#learn D from this fraction of the patches (see engine.train_select)
+	  param.max_train_patches=n;	#and from at most n patches
+	  param.store='dicts';	#dictionary store directory, warm start from it; store_mode='rw' also writes back (see DLEngine.learn)
+	  param.learner=None;	#skip the learning, threshold the patches in the DCT domain (see dct_denoise)
+	  param.geom=geom;	#PatchGeometry of din for these l,s (see patch.patch_geometry)
+	  param.chunk=n;	#stream the coding and reconstruction by chunks of n patches (see DLEngine.apply; bound the training set with max_train_patches; G is scipy.sparse unless sparse=0)
+	  param.emin=0;	#pass through patches with energy <= emin*mean patch energy (see engine.patch_skip)
+	  param.zmax=0.5;	#pass through patches with more than this fraction of zero samples
 	
 	OUTPUT
 	dout:
 	Dsgk,Gsgkc: learned dictionary and coefficients
 	DCT: initial dictionary
+	hist: per-iteration history (only when param.history=1)
 	
 	Key Reference
 	Chen, Y., 2020, Fast dictionary learning for noise attenuation of multidimensional seismic data, Geophysical Journal International, 222, 1717-1727.
@@ -44,97 +59,10 @@ def sgk_denoise(din,mode,l,s,perc,param):
 	Zu, S., H. Zhou, R. Wu, and Y. Chen, 2019, Hybrid-sparsity constrained dictionary learning for iterative deblending of extremely noisy simultaneous-source data, IEEE Transactions on Geoscience and Remote Sensing, 57, 2249-2262.
 	etc. 
 	"""
-	
+	from .engine import DLEngine
 	from .sgk import sgk
-	from .patch import patch2d,patch2d_inv,patch3d,patch3d_inv
-	from .threshold import pthresh
-	
-	
-	if np.ndim(din)==2:
-		[n1,n2]=din.shape;
-		n3=1;
-	else:
-		[n1,n2,n3]=din.shape;
 	
-	
-	l1=l[0];
-	l2=l[1];
-	l3=l[2];
-
-	s1=s[0];
-	s2=s[1];
-	s3=s[2];
-
-	#initialization
-	#[c1,c2,c3]: redundancy of the initial atom in 1st,2nd,3rd dimensions
-	#[l1,l2,l3]: patch sizes and the atom sizes in each dimension
-	if not ('D' in param):
-		if 'K' in param:
-			if n3==1:
-				c1=np.ceil(np.sqrt(param['K']));c1=int(c1);
-				c2=c1;
-			else:
-				c1=np.round(np.power(param['K'],(1/3.0)));c1=int(c1);
-				c2=c1;
-				c3=c1;
-		else:
-			c1=l1;
-			c2=l2;
-			c3=l3;
-
-		dct1=np.zeros([l1,c1]);
-		for k in range(0,c1):
-			tmp=np.arange(l1);
-			tmp=tmp[...,None]; #column vector
-			V=np.cos(tmp*k*np.pi/c1); 
-			if k>0:
-				V=V-np.mean(V);
-			dct1[:,k]=V.squeeze()/np.linalg.norm(V);
-	
-		dct2=np.zeros([l2,c2]);
-		for k in range(0,c2):
-			tmp=np.arange(l2);
-			tmp=tmp[...,None]; #column vector
-			V=np.cos(tmp*k*np.pi/c2);
-			if k>0:
-				V=V-np.mean(V);
-			dct2[:,k]=V.squeeze()/np.linalg.norm(V);
-	
-		if n3!=1:
-			dct3=np.zeros([l3,c3]);
-			for k in range(0,c3):
-				tmp=np.arange(l3);
-				tmp=tmp[...,None]; #column vector
-				V=np.cos(tmp*k*np.pi/c3);
-				if k>0:
-					V=V-np.mean(V);
-				dct3[:,k]=V.squeeze()/np.linalg.norm(V);
-	
-		if n3==1:
-			DCT=np.kron(dct1,dct2);	#2D DCT dictionary (l1*l2,c1*c2)
-		else:
-			DCT=np.kron(np.kron(dct1,dct2),dct3);	#3D DCT dictionary (l1*l2*l3,c1*c2*c3)
-		param['D']=DCT;
-	else:
-		DCT=param['D']
-	#SGK
-	if n3==1:
-		X=patch2d(din,l1,l2,s1,s2,mode).T;
-		[Dsgk,Gsgk]=sgk(X,param);
-		Gsgkc=Gsgk;
-		Gsgk,thr=pthresh(Gsgkc,'ph',perc);
-		X2=np.matmul(Dsgk,Gsgk).T;
-		dout=patch2d_inv(X2,n1,n2,l1,l2,s1,s2,mode);
-	else:
-		X=patch3d(din,l1,l2,l3,s1,s2,s3,mode)[:,:,0].T;
-		[Dsgk,Gsgk]=sgk(X,param);
-		Gsgkc=Gsgk;
-		Gsgk,thr=pthresh(Gsgkc,'ph',perc);
-		X2=np.matmul(Dsgk,Gsgk).T;
-		dout=patch3d_inv(X2,n1,n2,n3,l1,l2,l3,s1,s2,s3,mode);
-
-	return dout,Dsgk,Gsgkc,DCT
-
+	return DLEngine(sgk).denoise(din,mode,l,s,perc,param)
 
 
 def ksvd_denoise(din,mode,l,s,perc,param):
@@ -159,13 +87,29 @@ def ksvd_denoise(din,mode,l,s,perc,param):
 	  param: parameter struct for DL
 	  param.mode=1;   	#1: sparsity; 0: error
 	  param.niter=10; 	#number of K-SVD iterations to perform; default: 10
-	  param.D=DCT;    	#initial D
+	  param.D=DCT;    	#initial D (dense, or a KronDict/SparseDict, densified for learning)
+	  param.structured=0;	#1: build the initial DCT dictionary as a KronDict (see dct_dict)
 	  param.T=3;      	#sparsity level
+	  param.sparse=0;	#1: keep the coefficients as a scipy.sparse matrix
+	  param.n_jobs=1;	#processes for the sparse coding (-1: all cores)
+	  param.dtype=np.float32;	#work (patches, D, G, output) in single precision
+	  param.update='svd';	#K-SVD atom update, 'svd' or 'approx' (AK-SVD)
+	  param.tol=tol;		#stop the learning early (see ksvd)
+	  param.history=0;	#1: also return the per-iteration history (hist)
+	  param.train_fraction=1;	#learn D from this fraction of the patches (see engine.train_select)
+	  param.max_train_patches=n;	#and from at most n patches
+	  param.store='dicts';	#dictionary store directory, warm start from it; store_mode='rw' also writes back (see DLEngine.learn)
+	  param.learner=None;	#skip the learning, threshold the patches in the DCT domain (see dct_denoise)
+	  param.geom=geom;	#PatchGeometry of din for these l,s (see patch.patch_geometry)
+	  param.chunk=n;	#stream the coding and reconstruction by chunks of n patches (see DLEngine.apply; bound the training set with max_train_patches; G is scipy.sparse unless sparse=0)
+	  param.emin=0;	#pass through patches with energy <= emin*mean patch energy (see engine.patch_skip)
+	  param.zmax=0.5;	#pass through patches with more than this fraction of zero samples
 	
 	OUTPUT
 	dout:
 	Dksvd,Gksvdc: learned dictionary and coefficients
 	DCT: initial dictionary
+	hist: per-iteration history (only when param.history=1)
 	
 	Related Reference:
 	Chen, Y., 2020, Fast dictionary learning for noise attenuation of multidimensional seismic data, Geophysical Journal International, 222, 1717-1727.
@@ -180,95 +124,10 @@ def ksvd_denoise(din,mode,l,s,perc,param):
 	Zu, S., H. Zhou, R. Wu, and Y. Chen, 2019, Hybrid-sparsity constrained dictionary learning for iterative deblending of extremely noisy simultaneous-source data, IEEE Transactions on Geoscience and Remote Sensing, 57, 2249-2262.
 	etc. 
 	"""
+	from .engine import DLEngine
 	from .ksvd import ksvd
-	from .patch import patch2d,patch2d_inv,patch3d,patch3d_inv
-	from .threshold import pthresh
-
 	
-	if np.ndim(din)==2:
-		[n1,n2]=din.shape;
-		n3=1;
-	else:
-		[n1,n2,n3]=din.shape;
-	l1=l[0];
-	l2=l[1];
-	l3=l[2];
-
-	s1=s[0];
-	s2=s[1];
-	s3=s[2];
-
-	#initialization
-	#[c1,c2,c3]: redundancy of the initial atom in 1st,2nd,3rd dimensions
-	#[l1,l2,l3]: patch sizes and the atom sizes in each dimension
-	if not ('D' in param):
-		if 'K' in param:
-			if n3==1:
-				c1=np.ceil(np.sqrt(param['K']));c1=int(c1);
-				c2=c1;
-			else:
-				c1=np.round(np.power(param['K'],(1/3.0)));c1=int(c1);
-				c2=c1;
-				c3=c1;
-		else:
-			c1=l1;
-			c2=l2;
-			c3=l3;
-
-		dct1=np.zeros([l1,c1]);
-		for k in range(0,c1):
-			tmp=np.arange(l1);
-			tmp=tmp[...,None]; #column vector
-			V=np.cos(tmp*k*np.pi/c1); 
-			if k>0:
-				V=V-np.mean(V);
-			dct1[:,k]=V.squeeze()/np.linalg.norm(V);
-	
-		dct2=np.zeros([l2,c2]);
-		for k in range(0,c2):
-			tmp=np.arange(l2);
-			tmp=tmp[...,None]; #column vector
-			V=np.cos(tmp*k*np.pi/c2);
-			if k>0:
-				V=V-np.mean(V);
-			dct2[:,k]=V.squeeze()/np.linalg.norm(V);
-	
-		if n3!=1:
-			dct3=np.zeros([l3,c3]);
-			for k in range(0,c3):
-				tmp=np.arange(l3);
-				tmp=tmp[...,None]; #column vector
-				V=np.cos(tmp*k*np.pi/c3);
-				if k>0:
-					V=V-np.mean(V);
-				dct3[:,k]=V.squeeze()/np.linalg.norm(V);
-	
-		if n3==1:
-			DCT=np.kron(dct1,dct2);	#2D DCT dictionary (l1*l2,c1*c2)
-		else:
-			DCT=np.kron(np.kron(dct1,dct2),dct3);	#3D DCT dictionary (l1*l2*l3,c1*c2*c3)
-		param['D']=DCT;
-		
-	else:
-		DCT=param['D'].copy()
-		
-	#KSVD
-	if n3==1:
-		X=patch2d(din,l1,l2,s1,s2,mode).T;
-		[Dksvd,Gksvd]=ksvd(X,param);
-		Gksvdc=Gksvd;
-		Gksvd,thr=pthresh(Gksvdc,'ph',perc);
-		X2=np.matmul(Dksvd,Gksvd).T;
-		dout=patch2d_inv(X2,n1,n2,l1,l2,s1,s2,mode);
-	else:
-		X=patch3d(din,l1,l2,l3,s1,s2,s3,mode)[:,:,0].T;
-		[Dksvd,Gksvd]=ksvd(X,param);
-		Gksvdc=Gksvd;
-		Gksvd,thr=pthresh(Gksvdc,'ph',perc);
-		X2=np.matmul(Dksvd,Gksvd).T;
-		dout=patch3d_inv(X2,n1,n2,n3,l1,l2,l3,s1,s2,s3,mode);
-
-	return dout,Dksvd,Gksvdc,DCT
+	return DLEngine(ksvd).denoise(din,mode,l,s,perc,param)
 
 
 def fast_ksvd_denoise(din,mode,l,s,perc,param):
@@ -292,13 +151,29 @@ def fast_ksvd_denoise(din,mode,l,s,perc,param):
 		param: parameter struct for DL
 		param.mode=1;		#1: sparsity; 0: error
 		param.niter=10;		#number of K-SVD iterations to perform; default: 10
-		param.D=DCT;		#initial D
+		param.D=DCT;		#initial D (dense, or a KronDict/SparseDict, densified for learning)
+		param.structured=0;	#1: build the initial DCT dictionary as a KronDict (see dct_dict)
 		param.T=3;			#sparsity level
+		param.sparse=0;		#1: keep the coefficients as a scipy.sparse matrix
+		param.n_jobs=1;		#processes for the sparse coding (-1: all cores)
+		param.dtype=np.float32;	#work (patches, D, G, output) in single precision
+		param.update='svd';		#K-SVD atom update, 'svd' or 'approx' (AK-SVD)
+		param.tol=tol;			#stop the learning early (see ksvd)
+		param.history=0;		#1: also return the per-iteration history (hist)
+		param.train_fraction=1;	#learn D from this fraction of the patches (see engine.train_select)
+		param.max_train_patches=n;	#and from at most n patches
+		param.store='dicts';	#dictionary store directory, warm start from it; store_mode='rw' also writes back (see DLEngine.learn)
+		param.learner=None;	#skip the learning, threshold the patches in the DCT domain (see dct_denoise)
+		param.geom=geom;	#PatchGeometry of din for these l,s (see patch.patch_geometry)
+		param.chunk=n;	#stream the coding and reconstruction by chunks of n patches (see DLEngine.apply; bound the training set with max_train_patches; G is scipy.sparse unless sparse=0)
+		param.emin=0;	#pass through patches with energy <= emin*mean patch energy (see engine.patch_skip)
+		param.zmax=0.5;	#pass through patches with more than this fraction of zero samples
 		
 	OUTPUT
 		dout:
 		Dksvd,Gksvdc: learned dictionary and coefficients
 		DCT: initial dictionary
+		hist: per-iteration history (only when param.history=1)
 		
     Related Reference:
 	Chen, Y., 2020, Fast dictionary learning for noise attenuation of multidimensional seismic data, Geophysical Journal International, 222, 1717-1727.
@@ -313,94 +188,39 @@ def fast_ksvd_denoise(din,mode,l,s,perc,param):
 	Zu, S., H. Zhou, R. Wu, and Y. Chen, 2019, Hybrid-sparsity constrained dictionary learning for iterative deblending of extremely noisy simultaneous-source data, IEEE Transactions on Geoscience and Remote Sensing, 57, 2249-2262.
 	etc. 
 	"""
+	from .engine import DLEngine
 	from .ksvd import fast_ksvd
-	from .patch import patch2d,patch2d_inv,patch3d,patch3d_inv
-	from .threshold import pthresh
 	
-	if np.ndim(din)==2:
-		[n1,n2]=din.shape;
-		n3=1;
-	else:
-		[n1,n2,n3]=din.shape;
+	return DLEngine(fast_ksvd).denoise(din,mode,l,s,perc,param)
+
+
+def dct_denoise(din,mode,l,s,perc,param={}):
+	"""
+	dct_denoise: patch-wise DCT-domain thresholding for 2D and 3D denoising
+	
+	No dictionary is learned: every patch is transformed by the orthonormal
+	DCT-II (scipy.fft.dctn, O(M log M) per patch), the coefficients are hard
+	thresholded as in the dictionary-learning denoisers, and the patches are
+	transformed back and averaged. The DCT-II is not the transform of the
+	initial dictionary of the learners (dct_dict: mean-removed cosines,
+	redundant with param.K), so G is not the coding of the patches with that
+	dictionary. It is the no-learning option of sgk_denoise/ksvd_denoise
+	(param.learner=None there), e.g., to pick perc before learning, or to
+	pre-denoise the data the dictionary is learned from.
+	
+	INPUT
+	  din:   input data (2D or 3D)
+	  mode:  patching mode
+	  l:     [l1,l2,l3] patch sizes
+	  s:     [s1,s2,s3] shifting sizes
+	  perc:  percentage of the coefficients that are kept
+	  param: parameter struct, only param.dtype and param.geom are used
 	
-	l1=l[0];
-	l2=l[1];
-	l3=l[2];
+	OUTPUT
+	dout:  denoised data
+	G:     DCT coefficients of the patches before thresholding (MxN)
+	"""
+	from .engine import DLEngine
 	
-	s1=s[0];
-	s2=s[1];
-	s3=s[2];
-	    
-	#initialization
-	#[c1,c2,c3]: redundancy of the initial atom in 1st,2nd,3rd dimensions
-	#[l1,l2,l3]: patch sizes and the atom sizes in each dimension
-	if not ('D' in param):
-		if 'K' in param:
-			if n3==1:
-				c1=np.ceil(np.sqrt(param['K']));c1=int(c1);
-				c2=c1;
-				# print(c1,c2)
-			else:
-				c1=np.round(np.power(param['K'],(1/3.0)));c1=int(c1);
-				c2=c1;
-				c3=c1;
-		else:
-			c1=l1;
-			c2=l2;
-			c3=l3;
-			
-		dct1=np.zeros([l1,c1]);
-		for k in range(0,c1):
-			tmp=np.arange(l1);
-			tmp=tmp[...,None]; #column vector
-			V=np.cos(tmp*k*np.pi/c1); 
-			if k>0:
-				V=V-np.mean(V);
-			dct1[:,k]=V.squeeze()/np.linalg.norm(V);
-		
-		dct2=np.zeros([l2,c2]);
-		for k in range(0,c2):
-			tmp=np.arange(l2);
-			tmp=tmp[...,None]; #column vector
-			V=np.cos(tmp*k*np.pi/c2);
-			if k>0:
-				V=V-np.mean(V);
-			dct2[:,k]=V.squeeze()/np.linalg.norm(V);
-			
-		if n3!=1:
-			dct3=np.zeros([l3,c3]);
-			for k in range(0,c3):
-				tmp=np.arange(l3);
-				tmp=tmp[...,None]; #column vector
-				V=np.cos(tmp*k*np.pi/c3);
-				if k>0:
-					V=V-np.mean(V);
-				dct3[:,k]=V.squeeze()/np.linalg.norm(V);
-				
-		if n3==1:
-			DCT=np.kron(dct1,dct2);    #2D DCT dictionary (l1*l2,c1*c2)
-		else:
-			DCT=np.kron(np.kron(dct1,dct2),dct3);    #3D DCT dictionary (l1*l2*l3,c1*c2*c3)
-		param['D']=DCT;
-		
-	else:
-		DCT=param['D'].copy()
-		
-	#KSVD
-	if n3==1:
-		X=patch2d(din,l1,l2,s1,s2,mode).T;
-		[Dksvd,Gksvd]=fast_ksvd(X,param);
-		Gksvdc=Gksvd;
-		print(Dksvd.shape)
-		Gksvd,thr=pthresh(Gksvdc,'ph',perc);
-		X2=np.matmul(Dksvd,Gksvd).T;
-		dout=patch2d_inv(X2,n1,n2,l1,l2,s1,s2,mode);
-	else:
-		X=patch3d(din,l1,l2,l3,s1,s2,s3,mode)[:,:,0].T;
-		[Dksvd,Gksvd]=fast_ksvd(X,param);
-		Gksvdc=Gksvd;
-		Gksvd,thr=pthresh(Gksvdc,'ph',perc);
-		X2=np.matmul(Dksvd,Gksvd).T;
-		dout=patch3d_inv(X2,n1,n2,n3,l1,l2,l3,s1,s2,s3,mode);
-		
-	return dout,Dksvd,Gksvdc,DCT
+	dout,D,G,DCT=DLEngine(None).denoise(din,mode,l,s,perc,param);
+	return dout,G
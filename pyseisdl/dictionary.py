@@ -0,0 +1,255 @@
+import numpy as np
+import functools
+
+class KronDict:
+	"""
+	KronDict: separable (Kronecker) dictionary D=kron(F1,F2,...,Fd)
+
+	D is never formed. D^T*X and D*G are applied as a series of small
+	products along each patch axis (mode-n products), so that the cost
+	scales with the sum of the patch sides instead of their product. The atom order is the one
+	of np.kron, e.g., the 3D DCT dictionary np.kron(np.kron(dct1,dct2),dct3)
+	of the denoisers is KronDict(dct1,dct2,dct3).
+
+	INPUT
+	F1,F2,...: per-axis factors (li x ci), patch size l1*l2*..., K=c1*c2*...
+
+	EXAMPLE
+	D=KronDict(dct1,dct2,dct3)
+	G=batch_omp(D,X,T)		#D is accepted wherever batch_omp/omp1/dl_code take a dictionary
+	X2=D.dot(G)
+	"""
+	def __init__(self,*factors):
+		self.factors=[np.asarray(F) for F in factors];
+		self.l=[F.shape[0] for F in self.factors];
+		self.c=[F.shape[1] for F in self.factors];
+		self.shape=(int(np.prod(self.l)),int(np.prod(self.c)));
+		self.dtype=np.result_type(*self.factors);
+
+	def astype(self,dtype,copy=True):
+		return KronDict(*[F.astype(dtype,copy=copy) for F in self.factors])
+
+	def dense(self):
+		"""dense: the full MxK matrix"""
+		D=self.factors[0];
+		for F in self.factors[1:]:
+			D=np.kron(D,F);
+		return D
+
+	def gram(self):
+		"""gram: D^T*D (KxK), the Kronecker product of the small per-axis Grams"""
+		Gr=np.matmul(self.factors[0].T,self.factors[0]);
+		for F in self.factors[1:]:
+			Gr=np.kron(Gr,np.matmul(F.T,F));
+		return Gr
+
+	def rdot(self,X):
+		"""rdot: D^T*X for X (MxN)"""
+		return self._modes(X,[F.T for F in self.factors],self.l)
+
+	def dot(self,G):
+		"""dot: D*G for G (KxN), dense or scipy.sparse"""
+		import scipy.sparse
+		if scipy.sparse.issparse(G):
+			G=G.toarray();	#KxN, the size of the output; cheaper than building the used atoms one by one
+		return self._modes(G,self.factors,self.c)
+
+	def __matmul__(self,G):
+		return self.dot(G)
+
+	def _modes(self,X,mats,dims):
+		#apply mats[i] along axis i of each column of X reshaped to dims (C order)
+		N=X.shape[1];
+		Y=np.asarray(X);
+		pre=1;post=int(np.prod(dims))*N;
+		for F,d in zip(mats,dims):
+			post=post//d;
+			Y=np.matmul(F,Y.reshape(pre,d,post));	#(pre,d,post) -> (pre,l,post), no transposes
+			pre=pre*F.shape[0];
+		return Y.reshape(-1,N)
+
+
+class SparseDict:
+	"""
+	SparseDict: double-sparsity dictionary D=Phi*A
+
+	Every atom is a sparse combination of the atoms of a fixed base
+	dictionary Phi (e.g., a KronDict of DCTs), with A a scipy.sparse matrix
+	(Kb x K) of p nonzeros per column, so D is applied through Phi and A only.
+
+	INPUT
+	base:  base dictionary Phi (M x Kb), KronDict or dense
+	A:     sparse representation of the atoms (Kb x K)
+
+	Reference
+	Chen, Y., J. Ma, and S. Fomel, 2016, Double-sparsity dictionary for seismic
+	noise attenuation, Geophysics, 81, V17-V30.
+	Rubinstein, R., M. Zibulevsky, and M. Elad, 2010, Double sparsity: learning
+	sparse dictionaries for sparse signal approximation, IEEE Transactions on
+	Signal Processing, 58, 1553-1564.
+	"""
+	def __init__(self,base,A):
+		import scipy.sparse
+		self.base=base;
+		self.A=scipy.sparse.csc_matrix(A);
+		self.shape=(base.shape[0],self.A.shape[1]);
+		self.dtype=np.result_type(base.dtype,self.A.dtype);
+
+	def astype(self,dtype,copy=True):
+		base=self.base.astype(dtype,copy=copy);
+		return SparseDict(base,self.A.astype(dtype,copy=copy))
+
+	def dense(self):
+		"""dense: the full MxK matrix"""
+		return np.asarray(base_dot(self.base,self.A.toarray()))
+
+	def gram(self):
+		"""gram: D^T*D=A^T*(Phi^T*Phi)*A (KxK)"""
+		Gb=self.base.gram() if hasattr(self.base,'gram') else np.matmul(self.base.T,self.base);
+		return np.asarray(self.A.T@(self.A.T@Gb).T)
+
+	def rdot(self,X):
+		"""rdot: D^T*X=A^T*(Phi^T*X) for X (MxN)"""
+		Bx=self.base.rdot(X) if hasattr(self.base,'rdot') else np.matmul(self.base.T,X);
+		return np.asarray(self.A.T@Bx)
+
+	def dot(self,G):
+		"""dot: D*G=Phi*(A*G) for G (KxN), dense or scipy.sparse"""
+		return base_dot(self.base,self.A@G)
+
+	def __matmul__(self,G):
+		return self.dot(G)
+
+
+class GramDict:
+	"""
+	GramDict: dictionary with its Gram matrix D^T*D computed once
+
+	The coders (batch_omp, omp1, dl_code) build D^T*D on every call, i.e.,
+	once per chunk or per dataset. A fixed dictionary applied to many
+	datasets (see engine.DLModel) is wrapped in a GramDict, so that the Gram
+	matrix is computed once and shared by all the calls, also across
+	dtype casts (the Gram solve is always in double).
+
+	INPUT
+	D:     dictionary (MxK), dense or structured (KronDict, SparseDict)
+	DtD:   its Gram matrix (KxK); default: computed on first use
+	"""
+	def __init__(self,D,DtD=None):
+		self.D=D.D if isinstance(D,GramDict) else D;
+		self.shape=self.D.shape;
+		self.dtype=self.D.dtype;
+		self.DtD=DtD;
+
+	def astype(self,dtype,copy=True):
+		return GramDict(self.D.astype(dtype,copy=copy),self.gram())
+
+	def dense(self):
+		"""dense: the full MxK matrix"""
+		return self.D.dense() if hasattr(self.D,'dense') else np.asarray(self.D)
+
+	def gram(self):
+		"""gram: D^T*D (KxK, double), cached"""
+		if self.DtD is None:
+			from .omp import dict_gram
+			self.DtD=dict_gram(self.D);
+			self.DtD.flags.writeable=False;
+		return self.DtD
+
+	def rdot(self,X):
+		"""rdot: D^T*X for X (MxN)"""
+		if hasattr(self.D,'rdot'):
+			return self.D.rdot(X)
+		return np.matmul(self.D.T,X)
+
+	def dot(self,G):
+		"""dot: D*G for G (KxN), dense or scipy.sparse"""
+		return base_dot(self.D,G)
+
+	def __matmul__(self,G):
+		return self.dot(G)
+
+
+def sparse_dict(base,D,p):
+	"""
+	sparse_dict: double-sparsity form of a dictionary
+
+	Each atom of D is coded with p atoms of the base dictionary (batch OMP),
+	and the approximated atoms are normalized again.
+
+	INPUT
+	base:  base dictionary Phi (M x Kb), KronDict or dense
+	D:     dictionary to approximate (M x K), e.g., learned by sgk or ksvd
+	p:     number of base atoms per atom
+
+	OUTPUT
+	Ds:    SparseDict with Ds.dense() close to D
+	"""
+	import scipy.sparse
+	from .omp import batch_omp
+
+	A=batch_omp(base,D,p,sparse=True);
+	Ds=SparseDict(base,A);
+	nrm=np.sqrt(np.maximum(np.diag(Ds.gram()),0));
+	nrm[nrm==0]=1;
+	return SparseDict(base,Ds.A@scipy.sparse.diags(1/nrm))
+
+
+def base_dot(base,G):
+	"""base_dot: Phi*G for a structured or dense dictionary Phi"""
+	if hasattr(base,'dot') and not isinstance(base,np.ndarray):
+		return base.dot(G)
+	return np.asarray(base@G)
+
+
+def dict_dense(D):
+	"""dict_dense: dense MxK array of a structured (KronDict, SparseDict, GramDict) or dense dictionary"""
+	if hasattr(D,'dense') and not isinstance(D,np.ndarray):
+		return D.dense()
+	return np.asarray(D)
+
+
+def dct_dict(l,c=None,structured=False):
+	"""
+	dct_dict: DCT dictionary for patches of size l (the initial dictionary
+	of the denoisers)
+
+	Atom k of axis i is cos(n*k*pi/ci), n=0...li-1, with the mean removed
+	for k>0 and unit norm; the dictionary is the Kronecker product of the
+	per-axis factors. Dictionaries are cached by (l,c), so repeated calls
+	with the same geometry do not rebuild them.
+
+	INPUT
+	l:          patch sizes [l1,l2,...]
+	c:          atoms per axis [c1,c2,...]; default: l
+	structured: if True, return a KronDict instead of the dense matrix
+
+	OUTPUT
+	D:          dictionary (l1*l2*... x c1*c2*...), read-only (copy it to modify)
+	"""
+	l=tuple(int(li) for li in l);
+	c=l if c is None else tuple(int(ci) for ci in c);
+	if structured:
+		return KronDict(*[dct_factor(li,ci) for li,ci in zip(l,c)])
+	return _dct_dense(l,c)
+
+@functools.lru_cache(maxsize=64)
+def dct_factor(l,c):
+	"""dct_factor: 1D DCT factor (l x c) of dct_dict, cached and read-only"""
+	F=np.zeros([l,c]);
+	n=np.arange(l);
+	for k in range(0,c):
+		V=np.cos(n*k*np.pi/c);
+		if k>0:
+			V=V-np.mean(V);
+		F[:,k]=V/np.linalg.norm(V);
+	F.flags.writeable=False;
+	return F
+
+@functools.lru_cache(maxsize=16)
+def _dct_dense(l,c):
+	D=dct_factor(l[0],c[0]);
+	for li,ci in zip(l[1:],c[1:]):
+		D=np.kron(D,dct_factor(li,ci));
+	D.flags.writeable=False;
+	return D
@@ -0,0 +1,673 @@
+import numpy as np
+
+class DLEngine:
+	"""
+	DLEngine: dictionary-learning denoising engine for 2D and 3D data
+
+	One pipeline with the stages
+	  init_dict:   initial (DCT) dictionary
+	  patch:       patch matrix X (npix x npatch) of the data, or of a chunk
+	  learn:       dictionary D from the (training) patches
+	  code:        sparse coefficients G of the patches with D
+	  threshold:   percentile hard thresholding of G
+	  reconstruct: patches D*G averaged back into the data
+	and a pluggable learner and coder. fit runs the first three stages only
+	and returns the learned dictionary as a DLModel, whose transform runs the
+	last four with that fixed dictionary on any number of datasets. With
+	param.chunk the same stages are run chunk by chunk (see apply), so a
+	subclass overriding a stage changes the in-memory and the streaming
+	runs alike. sgk_denoise, ksvd_denoise and fast_ksvd_denoise are
+	DLEngine(sgk), DLEngine(ksvd) and DLEngine(fast_ksvd); the options of
+	param (train_fraction, store, chunk, emin/zmax, geom, dtype, ...) are
+	handled here for all of them.
+
+	INPUT
+	learner: learner(X,param) returning D,G[,hist] (sgk, ksvd, fast_ksvd,
+	         or any function of the same form); None: no learning, the
+	         patches are thresholded in the DCT domain (see dct)
+	coder:   coder(D,X,param,executor=None) returning the coefficients of
+	         the patches with the learned D (the code stage); default:
+	         omp.dl_code
+
+	EXAMPLE
+	from pyseisdl.engine import DLEngine
+	from pyseisdl.ksvd import ksvd
+	dout,D,G,DCT=DLEngine(ksvd).denoise(din,1,[4,4,4],[2,2,2],2,param)
+	model=DLEngine(ksvd).fit(shots[0],1,[4,4,4],[2,2,2],param)
+	dout,G=model.transform(shots[1],2)
+	"""
+	def __init__(self,learner=None,coder=None):
+		self.learner=learner;
+		self.coder=coder;
+
+	def denoise(self,din,mode,l,s,perc,param):
+		"""
+		denoise: the full pipeline, with the inputs and outputs of sgk_denoise
+
+		OUTPUT
+		dout,D,G,DCT[,hist]: denoised data, learned dictionary, coefficients
+		before thresholding, initial dictionary, and (param.history=1) the
+		history of the learner; with learner=None, D and DCT are None and G
+		are the DCT coefficients
+		"""
+		from .omp import noise_param
+
+		if 'dtype' in param:
+			din=np.asarray(din,dtype=param['dtype']);
+		if self.learner is None or ('learner' in param and param['learner'] is None):	#no learning, DCT-domain thresholding
+			dout,G=self.dct(din,mode,l,s,perc,param);
+			return dout,None,G,None
+		l=list(l[0:np.ndim(din)]);
+		s=list(s[0:np.ndim(din)]);
+		geom=self.geometry(din,l,s,param);
+
+		DCT=self.init_dict(din,l,param);
+		param=noise_param(din,param);	#one noise level for learning and coding, in memory or by chunks
+		if 'chunk' in param:	#only the training patches and one chunk at a time are formed
+			X,skip=self.train(din,geom,param);
+			par=dict(param);
+			par.pop('train_fraction',None);
+			par.pop('max_train_patches',None);
+			res=self.learn(X,par,l);
+			del X;
+			dout,G=self.apply(res[0],din,mode,geom,perc,param,skip);
+		else:
+			X=self.patch(din,mode,geom);
+			skip=patch_skip(X,param);	#patches left out of learning and coding
+			res=self.learn(X,param,l,skip);
+			G=self.code(res[0],X,param,skip);
+			Gt,thr=self.threshold(G,perc,skip);
+			dout=self.reconstruct(res[0],Gt,X,mode,geom,skip);
+		res=(res[0],G)+tuple(res[2:]);
+
+		if 'history' in param and param['history']:
+			return dout,res[0],res[1],DCT,res[2]
+		return dout,res[0],res[1],DCT
+
+
+	def fit(self,din,mode,l,s,param):
+		"""
+		fit: learn the dictionary of the data, without coding all its patches
+
+		Only the training patches (param.train_fraction, param.emin/zmax,
+		see train) are extracted and passed to the learner; param.store,
+		param.dtype and param.D work as in denoise. A learner is required
+		(ValueError otherwise): a fixed dictionary, e.g., the KronDict
+		dct_dict(l,c,True), is applied by DLModel(D,l,s,mode,param) directly.
+
+		INPUT
+		din,mode,l,s,param: as in sgk_denoise (no perc)
+
+		OUTPUT
+		model: DLModel with the learned dictionary, the patching (l,s,mode)
+		       and the coding parameters, to be applied by model.transform
+		"""
+		from .omp import noise_param
+
+		if self.learner is None or ('learner' in param and param['learner'] is None):	#denoise thresholds in the DCT domain instead
+			raise ValueError('fit needs a learner, a fixed dictionary is applied by DLModel directly')
+		if 'dtype' in param:
+			din=np.asarray(din,dtype=param['dtype']);
+		l=list(l[0:np.ndim(din)]);
+		s=list(s[0:np.ndim(din)]);
+		geom=self.geometry(din,l,s,param);
+
+		self.init_dict(din,l,param);
+		X,skip=self.train(din,geom,param);
+		par=dict(noise_param(din,param));	#the model keeps param: transform estimates the noise of each dataset
+		par.pop('train_fraction',None);
+		par.pop('max_train_patches',None);
+		res=self.learn(X,par,l);
+		hist=res[2] if len(res)>2 else None;
+		return DLModel(res[0],l,s,mode,param,self.coder,hist)
+
+	def apply(self,D,din,mode,geom,perc,param,skip=None):
+		"""
+		apply: streaming code, threshold and reconstruct stages with a fixed
+		dictionary, chunk by chunk
+
+		Pass 1 extracts the patches chunk by chunk (patch) and sparse codes
+		them (code); only the sparse coefficients are kept (T values per
+		patch), from which the global percentile threshold is taken
+		(threshold, as on all patches in memory). Pass 2 reconstructs the
+		patches of each chunk from the thresholded coefficients and adds
+		them into the output accumulator (reconstruct). Neither the full
+		patch matrix X, a dense G nor the reconstructed patches D*G are ever
+		formed: the apply phase needs the data, the output, the sparse G and
+		O(chunk) memory (chunks are boxes of at most param.chunk patches,
+		see PatchGeometry.chunks).
+
+		INPUT
+		D:     dictionary (MxK), dense or structured (see dictionary.py)
+		din:   input data
+		mode:  patching mode
+		geom:  PatchGeometry of din
+		perc:  percentage of the coefficients that are kept
+		param: parameter struct of the learner (mode, T, sigma/eps, n_jobs,
+		       dtype as in sgk), plus param.chunk=n (patches per chunk); with
+		       mode=0 and neither sigma nor eps, sigma is estimated from din
+		       (see omp.noise_param)
+		skip:  patches (N, boolean) that are not coded and pass through
+		       unchanged; default: from param.emin/param.zmax (see patch_skip)
+
+		OUTPUT
+		dout:  denoised data
+		G:     coefficients of all patches before thresholding (KxN), scipy.sparse
+		       CSC, or dense when param.sparse=0 is given explicitly
+		"""
+		import scipy.sparse
+		from .omp import omp_executor,noise_param
+
+		par=dict(noise_param(din,param));	#one estimate for all chunks
+		par['sparse']=1;
+		chunks=geom.chunks(int(param['chunk']));
+		W=geom.windows(din);
+		if skip is None and ('emin' in param or 'zmax' in param):
+			e,zf=chunk_stats(geom,W,chunks,'zmax' in param);
+			skip=patch_skip(None,param,e,zf);
+		pool,own=omp_executor(par);
+
+		Gs=[];
+		try:
+			for q0,q1,box in chunks:
+				Xc=self.patch(din,mode,geom,box,W);
+				Gs.append(self.code(D,Xc,par,None if skip is None else skip[q0:q1],pool));
+		finally:	#also on errors, so no worker processes are left running
+			if own:
+				pool.shutdown();
+		G=scipy.sparse.hstack([scipy.sparse.csc_matrix(g) for g in Gs],format='csc');	#a coder may return dense blocks
+		del Gs;
+		Gt,thr=self.threshold(G,perc,skip);
+
+		A=np.zeros(geom.N,dtype=np.result_type(din.dtype,D.dtype,np.float32));
+		for q0,q1,box in chunks:
+			if skip is None:
+				self.reconstruct(D,Gt[:,q0:q1],None,mode,geom,None,A,box);
+			else:
+				self.reconstruct(D,Gt[:,q0:q1],self.patch(din,mode,geom,box,W),mode,geom,skip[q0:q1],A,box);
+		dout=geom.normalize(A);
+		if 'sparse' in param and not param['sparse']:	#sparse by default, a dense G is O(N*K)
+			G=G.toarray();
+		return dout,G
+
+	def dct(self,din,mode,l,s,perc,param):
+		"""
+		dct: the pipeline without a learner, patch-wise DCT-domain
+		thresholding (see denoise.dct_denoise)
+
+		Every patch is transformed by the orthonormal DCT-II (scipy.fft.dctn,
+		O(M log M) per patch), the coefficients are hard thresholded as in
+		the threshold stage, and the patches are transformed back and
+		averaged.
+
+		OUTPUT
+		dout:  denoised data
+		G:     DCT coefficients of the patches before thresholding (MxN)
+		"""
+		import scipy.fft
+		from .patch import patch2d,patch2d_inv,patch3d,patch3d_inv
+		from .threshold import pthresh
+
+		if 'dtype' in param:
+			din=np.asarray(din,dtype=param['dtype']);
+		geom=param['geom'] if 'geom' in param else None;	#PatchGeometry of din, see patch.patch_geometry
+		if np.ndim(din)==2:
+			[n1,n2]=din.shape;
+			X=patch2d(din,l[0],l[1],s[0],s[1],mode,geom).T;
+			shape=[l[1],l[0]];	#patches are stored in Fortran order
+		else:
+			[n1,n2,n3]=din.shape;
+			X=patch3d(din,l[0],l[1],l[2],s[0],s[1],s[2],mode,geom)[:,:,0].T;
+			shape=[l[2],l[1],l[0]];
+		N=X.shape[1];
+		axes=list(range(0,len(shape)));
+
+		G=scipy.fft.dctn(X.reshape(shape+[N]),axes=axes,norm='ortho').reshape(-1,N);	#X is (npix,npatch), no transposes
+		G2,thr=pthresh(G,'ph',perc);
+		X2=scipy.fft.idctn(G2.reshape(shape+[N]),axes=axes,norm='ortho').reshape(-1,N).T;
+
+		if np.ndim(din)==2:
+			dout=patch2d_inv(X2,n1,n2,l[0],l[1],s[0],s[1],mode,geom);
+		else:
+			dout=patch3d_inv(X2,n1,n2,n3,l[0],l[1],l[2],s[0],s[1],s[2],mode,geom);
+		return dout,G
+
+	def geometry(self,din,l,s,param):
+		"""geometry: PatchGeometry of the data (param.geom, checked against din, l and s, or the cached one)"""
+		from .patch import patch_geometry
+
+		if 'geom' in param and param['geom'] is not None:
+			return param['geom'].check(din.shape,l,s)
+		return patch_geometry(din.shape,l,s)
+
+	def init_dict(self,din,l,param):
+		"""init_dict: initial dictionary, param.D or the DCT dictionary (stored in param.D)"""
+		if not ('D' in param):
+			n3=din.shape[2] if np.ndim(din)>2 else 1;
+			param['D']=dct_init(list(l)+[1],n3,param);	#built once per (l,c), see dictionary.dct_dict
+			return param['D']
+		if not isinstance(param['D'],np.ndarray):	#structured dictionaries are not modified in place
+			return param['D']
+		return param['D'].copy()
+
+	def patch(self,din,mode,geom,box=None,W=None):
+		"""patch: patch matrix (npix x npatch) of the data, or of the chunk box (W: geom.windows(din), to pad din once)"""
+		from .patch import patchnd
+
+		if box is None:
+			return patchnd(din,mode=mode,geom=geom)
+		return geom.gather(geom.windows(din) if W is None else W,box)
+
+	def train(self,din,geom,param):
+		"""
+		train: training patches of the data, gathered chunk by chunk
+
+		The patch energies (and zero fractions) are computed chunk by chunk (see
+		chunk_stats), the skipped patches (see patch_skip) are left out and the
+		training subsample is drawn from the others (see train_select); only the
+		chunks holding training patches are gathered.
+
+		INPUT
+		din:   input data
+		geom:  PatchGeometry of din
+		param: parameter struct (chunk, train_fraction, max_train_patches,
+		       emin, zmax); default chunk: all patches at once
+
+		OUTPUT
+		X:     training patches (M x Ntrain)
+		skip:  patches (N, boolean) left out of learning and coding, or None
+		"""
+		W=geom.windows(din);
+		chunks=geom.chunks(int(param['chunk']) if 'chunk' in param else geom.npatch);
+		e,zf=chunk_stats(geom,W,chunks,'zmax' in param);
+		skip=patch_skip(None,param,e,zf);
+		if skip is None:
+			inds=train_select(None,param,e);
+		else:
+			act=np.where(~skip)[0];
+			inds=train_select(None,param,e[act]);
+			inds=act if inds is None else act[inds];
+		if inds is None:
+			X=geom.extract(din);
+		elif inds.size==0:
+			X=np.zeros([geom.npix,0],dtype=din.dtype);
+		else:
+			cut=np.searchsorted(inds,[q0 for q0,q1,box in chunks]+[geom.npatch]);
+			X=np.concatenate([geom.gather(W,box)[:,inds[cut[i]:cut[i+1]]-q0]
+				for i,(q0,q1,box) in enumerate(chunks) if cut[i+1]>cut[i]],axis=1);	#only the chunks holding training patches are gathered
+		return X,skip
+
+	def learn(self,X,param,l=None,skip=None):
+		"""
+		learn: dictionary from a subsample of the patches (see train_select);
+		the patches are coded by the code stage
+
+		With param.store, the latest dictionary of the same patch shape, K, T,
+		learner (and param.survey) in the store is used as the initial D, and only
+		param.niter_warm iterations are run. With param.store_mode='rw' or 'w'
+		the learned dictionary is saved back as a new version (see store.py),
+		unless it differs from the warm start by no more than param.store_tol.
+
+		INPUT
+		X:       patches (MxN)
+		param:   parameter struct of the learner
+		  param.store='dicts';	#store directory; default: no store
+		  param.store_mode='r';	#'r': only read, 'w': only write, 'rw': both; default: 'r'
+		  param.store_tol=0;	#do not write back when |D-Dwarm|_F<=store_tol*|Dwarm|_F; default: 0
+		  param.survey='name';	#survey name, part of the dictionary key; optional
+		  param.niter_warm=2;	#iterations when warm started from the store; default: 2
+		l:       patch shape [l1,l2(,l3)], for the store key
+		skip:    patches (N, boolean) left out of learning (see patch_skip); optional
+
+		OUTPUT
+		D,None[,hist]: learned dictionary, and the history of the learner
+		               (param.history=1)
+		"""
+		from .dictionary import dict_dense
+
+		learner=self.learner;
+		param=dict(param);
+		param['final_coding']=0;	#D only, the patches are coded by code
+		store=param['store'] if 'store' in param else None;
+		if store is not None:
+			from .store import store_key,store_load,store_save,data_fingerprint
+			smode=param['store_mode'] if 'store_mode' in param else 'r';	#write-back is opt-in
+			Dw=None;
+			K=param['K'] if 'K' in param else param['D'].shape[1];
+			T=param['T'] if 'T' in param else 0;
+			key=store_key(l if l is not None else [X.shape[0]],K,T,learner.__name__,param['survey'] if 'survey' in param else None);
+			if 'r' in smode:
+				Dw,meta=store_load(store,key);
+				if Dw is not None and Dw.shape==(X.shape[0],K):
+					param['D']=Dw;
+					param['niter']=param['niter_warm'] if 'niter_warm' in param else 2;
+
+		Xa=X if skip is None else X[:,np.where(~skip)[0]];
+		if Xa.shape[1]==0:	#nothing to learn from
+			K=param['K'] if 'K' in param else param['D'].shape[1];
+			hist=({'err':[],'dchange':[]},) if 'history' in param and param['history'] else ();
+			return (np.array(dict_dense(param['D'])[:,0:K]),None)+hist
+
+		inds=train_select(Xa,param);
+		res=learner(Xa if inds is None else Xa[:,inds],param);
+		res=(res[0],None)+tuple(res[2:]);	#a custom learner may still return its G
+
+		if store is not None and 'w' in smode and not (Dw is not None and Dw.shape==res[0].shape
+				and np.linalg.norm(res[0]-Dw)<=(param['store_tol'] if 'store_tol' in param else 0)*np.linalg.norm(Dw)):
+			meta={'patch':[int(li) for li in l] if l is not None else [X.shape[0]],'K':int(K),'T':int(T),'mode':int(param['mode']),
+				'learner':learner.__name__,'niter':int(param['niter']),'fingerprint':data_fingerprint(X)};
+			store_save(store,key,res[0],meta);
+		return res
+
+	def code(self,D,X,param,skip=None,executor=None):
+		"""code: coefficients (KxN) of the patches with a fixed dictionary, zero for the skipped patches"""
+		from .omp import dl_code
+
+		coder=self.coder if self.coder is not None else dl_code;
+		if skip is None:
+			return coder(D,X,param,executor=executor)
+		act=np.where(~skip)[0];
+		return expand_cols(coder(D,X[:,act],param,executor=executor),act,X.shape[1],param)
+
+	def threshold(self,G,perc,skip=None):
+		"""threshold: percentile hard thresholding, pthresh(G,'ph',perc), with the percentile taken over the coded patches"""
+		from .threshold import pthresh
+
+		if skip is None:
+			return pthresh(G,'ph',perc)
+		if np.all(skip):	#no coded patch, all coefficients are zero
+			return pthresh(G,'h',np.inf)
+		Ga,thr=pthresh(G[:,np.where(~skip)[0]],'ph',perc);
+		return pthresh(G,'h',thr)
+
+	def reconstruct(self,D,G,X,mode,geom,skip=None,A=None,box=None):
+		"""
+		reconstruct: data from the patches D*G (X for the skipped patches);
+		with box, the patches of that chunk are added into the accumulator A
+		(see PatchGeometry.scatter) and A is returned
+		"""
+		from .patch import patchnd_inv
+		from .dictionary import base_dot
+
+		X2=np.ascontiguousarray(base_dot(D,G),dtype=None if A is None else A.dtype);	#G may be dense or scipy.sparse
+		if skip is not None:
+			sk=np.where(skip)[0];
+			X2[:,sk]=X[:,sk];	#skipped patches pass through unchanged
+		if box is None:
+			return patchnd_inv(X2,mode=mode,geom=geom)
+		return geom.scatter(A,X2,box)
+
+
+class DLModel:
+	"""
+	DLModel: a learned dictionary with its patching and coding parameters,
+	applied to new data without learning (see DLEngine.fit)
+
+	The dictionary is kept as a GramDict, so D^T*D is computed once for all
+	the datasets and chunks the model is applied to. Typical use: fit on a
+	few representative shots, transform all the others.
+
+	INPUT
+	D:       dictionary (MxK), dense or structured (see dictionary.py)
+	l,s:     patch and shifting sizes
+	mode:    patching mode (see patchnd)
+	param:   coding parameters (mode, T, sigma/eps, sparse, n_jobs, dtype,
+	         chunk, emin/zmax as in sgk_denoise); param.D is not kept
+	coder:   coder(D,X,param,executor=None); default: omp.dl_code
+	hist:    history of the learner (param.history=1), optional
+
+	EXAMPLE
+	model=DLEngine(sgk).fit(shots[0],1,[4,4,4],[2,2,2],param)
+	model.save('dicts','survey1_l4x4x4_K64_T3_sgk')
+	model=DLModel.load('dicts','survey1_l4x4x4_K64_T3_sgk')
+	for shot in shots:
+		dout,G=model.transform(shot,2)
+	"""
+	def __init__(self,D,l,s,mode,param,coder=None,hist=None):
+		from .dictionary import GramDict
+
+		self.D=D;
+		self.dictionary=GramDict(D);
+		self.l=list(l);
+		self.s=list(s);
+		self.mode=mode;
+		self.param={k:v for k,v in param.items() if k not in ('D','geom')};
+		self.coder=coder;
+		self.engine=DLEngine(None,coder);	#the code, threshold and reconstruct stages
+		self.hist=hist;
+
+	def transform(self,din,perc,param=None):
+		"""
+		transform: denoise data with the fixed dictionary (patch, code,
+		threshold, reconstruct); no learning iterations
+
+		INPUT
+		din:   input data (2D or 3D), of any size
+		perc:  percentage of the coefficients that are kept
+		param: coding parameters overriding those of the model; optional
+
+		OUTPUT
+		dout:  denoised data
+		G:     coefficients before thresholding (KxN)
+		"""
+		from .omp import noise_param
+
+		par=dict(self.param);
+		if param is not None:
+			par.update(param);
+		if 'dtype' in par:
+			din=np.asarray(din,dtype=par['dtype']);
+		par=noise_param(din,par);
+		D=self.dictionary;
+		if 'dtype' in par:
+			D=D.astype(par['dtype'],copy=False);	#keeps the cached Gram matrix
+		eng=self.engine;
+		geom=eng.geometry(din,self.l,self.s,par);
+
+		if 'chunk' in par:	#streaming, see DLEngine.apply
+			return eng.apply(D,din,self.mode,geom,perc,par)
+		X=eng.patch(din,self.mode,geom);
+		skip=patch_skip(X,par);
+		G=eng.code(D,X,par,skip);
+		Gt,thr=eng.threshold(G,perc,skip);
+		dout=eng.reconstruct(D,Gt,X,self.mode,geom,skip);
+		return dout,G
+
+	def save(self,path,key):
+		"""
+		save: save the model as a new version of key in the dictionary store
+		(see store.py); returns the version number
+		"""
+		from .store import store_save
+
+		D=self.D.dense() if hasattr(self.D,'dense') else self.D;
+		par={};	#the JSON-serializable options (numbers, strings, dtype)
+		for k,v in self.param.items():
+			if k=='dtype':
+				par[k]=np.dtype(v).name;
+			elif isinstance(v,(int,float,str,bool,np.generic)):
+				par[k]=v.item() if isinstance(v,np.generic) else v;
+		meta={'patch':[int(li) for li in self.l],'shift':[int(si) for si in self.s],'patch_mode':int(self.mode),'param':par};
+		return store_save(path,key,np.asarray(D),meta)
+
+	@staticmethod
+	def load(path,key,version=None,coder=None):
+		"""
+		load: model saved by DLModel.save (the latest version by default);
+		None if not in the store
+		"""
+		from .store import store_load
+
+		D,meta=store_load(path,key,version);
+		if D is None or not ('shift' in meta):
+			return None
+		return DLModel(D,meta['patch'],meta['shift'],meta['patch_mode'],meta['param'],coder)
+
+
+def patch_skip(X,param,e=None,zf=None):
+	"""
+	patch_skip: patches to leave out of learning and coding
+	
+	Muted zones, dead traces and the zero padding of the patching give
+	patches with (almost) no energy or mostly zero samples. They are not
+	used to learn the dictionary, get no coefficients, and pass through the
+	denoising unchanged.
+	
+	INPUT
+	X:     patches (MxN)
+	param: parameter struct
+	  param.emin=0;		#skip patches with energy <= emin times the mean patch energy
+	  param.zmax=0.5;	#skip patches with more than this fraction of exactly zero samples
+	e,zf:  energies and zero fractions of the patches (N), instead of X (X=None); optional
+	
+	OUTPUT
+	skip:  patches to skip (N, boolean), or None when there are none
+	"""
+	if not ('emin' in param or 'zmax' in param):
+		return None
+	if e is None:
+		e=np.sum(X*X,0,dtype=np.float64);
+	skip=np.zeros(e.size,dtype=bool);
+	if 'emin' in param:
+		skip=skip|(e<=param['emin']*np.mean(e));
+	if 'zmax' in param:
+		if zf is None:
+			zf=np.mean(X==0,0);
+		skip=skip|(zf>param['zmax']);
+	if not np.any(skip):
+		return None
+	return skip
+
+
+def chunk_stats(geom,W,chunks,zeros=True):
+	"""
+	chunk_stats: energies (and zero fractions) of all patches, chunk by chunk
+	
+	INPUT
+	geom:   PatchGeometry
+	W:      windows of the data (geom.windows)
+	chunks: chunks (q0,q1,box) of patches (see PatchGeometry.chunks)
+	zeros:  also compute the fractions of zero samples
+	
+	OUTPUT
+	e,zf:   energies and zero fractions (None if not zeros) of the patches (N)
+	"""
+	e=[];zf=[];
+	for q0,q1,box in chunks:
+		Xc=geom.gather(W,box);
+		e.append(np.sum(Xc*Xc,0,dtype=np.float64));
+		if zeros:
+			zf.append(np.mean(Xc==0,0));
+	return np.concatenate(e),(np.concatenate(zf) if zeros else None)
+
+
+def expand_cols(G,cols,N,param):
+	"""
+	expand_cols: coefficients of all N patches from those of the patches
+	cols (the other columns are zero); dense or scipy.sparse CSC as G, or
+	as param.sparse when G is empty
+	"""
+	import scipy.sparse
+	
+	if scipy.sparse.issparse(G) or G.shape[1]==0 and 'sparse' in param and param['sparse']:
+		G=scipy.sparse.csc_matrix(G);
+		S=scipy.sparse.csc_matrix((np.ones(cols.size,dtype=G.dtype),(np.arange(cols.size),cols)),shape=(cols.size,N));
+		return (G@S).tocsc()
+	Gf=np.zeros([G.shape[0],N],dtype=G.dtype);
+	Gf[:,cols]=G;
+	return Gf
+
+
+def train_select(X,param,e=None):
+	"""
+	train_select: energy-stratified subsample of the patches for training
+	
+	The patches are binned by energy (|x|^2) into strata of equal width in
+	log scale (zero patches form their own stratum), and the same number of
+	patches is drawn at random from every stratum (all of them when a
+	stratum is smaller), so that the many quiet patches do not dominate the
+	sample.
+	
+	INPUT
+	X:     patches (MxN)
+	param: parameter struct
+	  param.train_fraction=f;	#fraction of the patches to use; default: 1
+	  param.max_train_patches=n;	#maximum number of patches; default: N
+	  param.train_strata=10;	#number of energy strata; default: 10
+	  param.seed=0;			#random seed; default: 0
+	
+	e:     energies of the patches (N), instead of X (X=None); optional
+	
+	OUTPUT
+	inds:  sorted indices of the selected patches, or None to use all patches
+	"""
+	N=X.shape[1] if e is None else e.size;
+	n=N;
+	if 'train_fraction' in param:
+		n=int(np.ceil(param['train_fraction']*N));
+	if 'max_train_patches' in param:
+		n=min(n,int(param['max_train_patches']));
+	if n>=N:
+		return None
+	nstrata=param['train_strata'] if 'train_strata' in param else 10;
+	rng=np.random.default_rng(param['seed'] if 'seed' in param else 0);
+	
+	if e is None:
+		e=np.sum(X*X,0,dtype=np.float64);
+	lab=np.zeros(N,dtype=int);		#stratum 0: zero patches
+	nz=e>0;
+	if np.any(nz):
+		le=np.log10(e[nz]);
+		edges=np.linspace(le.min(),le.max(),nstrata+1);
+		lab[nz]=1+np.clip(np.searchsorted(edges,le,side='right')-1,0,nstrata-1);
+	strata=[np.where(lab==i)[0] for i in range(0,nstrata+1)];
+	strata=[st for st in strata if st.size>0];
+	
+	#equal quota per stratum, leftovers of the small strata go to the others
+	quota=np.zeros(len(strata),dtype=int);
+	size=np.array([st.size for st in strata]);
+	left=n;
+	while left>0:
+		open_,=np.where(quota<size);
+		q=max(left//open_.size,1);
+		for i in open_:
+			add=min(q,size[i]-quota[i],left);
+			quota[i]=quota[i]+add;
+			left=left-add;
+			if left==0:
+				break;
+	inds=np.concatenate([rng.choice(st,quota[i],replace=False) for i,st in enumerate(strata)]);
+	return np.sort(inds)
+
+
+def dct_init(l,n3,param):
+	"""
+	dct_init: initial DCT dictionary of the denoisers
+	
+	INPUT
+	l:     patch sizes [l1,l2,l3] (l3 is ignored for 2D data, n3=1)
+	n3:    third dimension of the data
+	param: parameter struct, param.K sets the redundancy c of each axis
+	       (c=ceil(sqrt(K)) in 2D, c=round(K^(1/3)) in 3D); default: c=l;
+	       param.structured=1 gives a KronDict instead of the dense matrix
+	
+	OUTPUT
+	DCT:   dictionary (l1*l2 x c1*c2 or l1*l2*l3 x c1*c2*c3), read-only
+	"""
+	from .dictionary import dct_dict
+	
+	#[c1,c2,c3]: redundancy of the initial atom in 1st,2nd,3rd dimensions
+	#[l1,l2,l3]: patch sizes and the atom sizes in each dimension
+	if n3==1:
+		l=[l[0],l[1]];
+		if 'K' in param:
+			c=[int(np.ceil(np.sqrt(param['K'])))]*2;
+		else:
+			c=l;
+	else:
+		l=[l[0],l[1],l[2]];
+		if 'K' in param:
+			c=[int(np.round(np.power(param['K'],(1/3.0))))]*3;
+		else:
+			c=l;
+	return dct_dict(l,c,'structured' in param and param['structured'])
@@ -1,4 +1,5 @@
 import numpy as np
+from .sgk import ompN	#multi-column sparse coding, shared with sgk
 
 def ksvd(X,param):
 	"""
@@ -13,11 +14,23 @@ def ksvd(X,param):
 	  param.mode=1;   	#1: sparsity; 0: error
 	  param.niter=10; 	#number of SGK iterations to perform; default: 10
 	  param.D=DCT;    	#initial D
-	  param.T=3;      	#sparsity level
+	  param.T=3;      	#sparsity level (cap on the atoms per patch when mode=0; default: M)
+	  param.sigma=sigma;	#noise level for mode=0; default: estimated from X (see omp_eps)
+	  param.sparse=0;	#1: return G as a scipy.sparse CSC matrix; default: 0 (dense)
+	  param.n_jobs=1;	#processes for the sparse coding (-1: all cores); default: 1
+	  param.dtype=np.float32;	#floating type of X, D and G; default: as given
+	  param.update='svd';	#atom update, 'svd': exact rank-1 SVD; 'approx': AK-SVD; default: 'svd'
+	  param.tol=tol;		#stop early when the relative change of the error is below tol
+	  param.dtol=dtol;		#stop early when the relative change of D is below dtol
+	  param.history=0;	#1: also return the per-iteration history
+	  param.final_coding=1;	#0: skip the final coding of X with the learned D (G is None)
 	
 	OUTPUT
 	D:    learned dictionary
 	G:    sparse coefficients
+	hist: (only when param.history=1) hist['err']: relative representation
+	      error |X-DG|_F/|X|_F of each iteration, hist['dchange']: relative
+	      change of D in each iteration
 	
 	for X=DG
 	size of X: MxN
@@ -27,45 +40,65 @@ def ksvd(X,param):
 	DEMO
 	demos/test_pyseisdl_sgk3d.py
 	"""
-	import scipy
-	import scipy.linalg
-	T=param['T'];	#T=1; 	#requred by SGK
+	from .omp import omp_eps,atom_support,omp_executor,dl_track
+	from .dictionary import dict_dense
 	niter=param['niter'];
 	mode=param['mode'];
+	if mode==1:
+		T=param['T'];
+		eps=None;
+	else:
+		T=param['T'] if 'T' in param else X.shape[0];
+		eps=omp_eps(X,param);
 	if 'K' in param:
 		K=param['K'];
 	else:
 		K=param['D'].shape[1];	#dictionary size: number of atoms
-
-	D=param['D'][:,0:K].copy();
-
-	for iter in range(0,niter):
+	update=param['update'] if 'update' in param else 'svd';
+
+	D=dict_dense(param['D'])[:,0:K].copy();	#a structured param.D (KronDict, SparseDict) is learned in dense form
+	if 'dtype' in param:	#e.g., np.float32 to keep X, D and G in single precision
+		X=X.astype(param['dtype'],copy=False);
+		D=D.astype(param['dtype'],copy=False);
+	pool,own=omp_executor(param);	#parallel sparse coding when param['n_jobs']>1
+	hist={'err':[],'dchange':[]};
+	xnrm=np.linalg.norm(X);
+	try:
+		for iter in range(0,niter):
 	
-		if mode==1:
-			G=ompN(D,X,T);
-			# exact form
-		else:
-			#error defined sparse coding
-			pass;
-			
-		E0=X-np.matmul(D,G);#error before updating
-		for ik in range(0,K): 	#KSVD iteration, K times SVD
-			E=E0+np.matmul(np.expand_dims(D[:,ik],1),np.expand_dims(G[ik,:],0));
-			inds,=np.where(G[ik,:]!=0);
-			R=E[:,inds];
-			if R.size>20000:
-				[u,s,v]=scipy.sparse.linalg.svds(R,1);
+			if mode==1:
+				G,err=ompN(D,X,T,sparse=True,executor=pool,return_err=True);
+				# exact form
 			else:
-				[u,s,v]=scipy.linalg.svd(R);
+				#error defined sparse coding
+				G,err=ompN(D,X,T,eps,sparse=True,executor=pool,return_err=True);
 			
-			#scipy.sparse.linalg.svds  ?
-			if u.size!=0:
-				D[:,ik]=u[:,0];
-				G[ik,inds]=s[0]*v[0,:];
-
-	# extra step
-	G=ompN(D,X,T);
-
+			D0=D.copy();
+			ptr,cols,pos=atom_support(G);	#patches using each atom
+			for ik in range(0,K): 	#KSVD iteration, K times SVD
+				inds=cols[ptr[ik]:ptr[ik+1]];
+				if inds.size==0:	#unused atom, nothing to update
+					continue;
+				p=pos[ptr[ik]:ptr[ik+1]];
+				#residual without atom ik, only on the patches using it (D and G are updated in place)
+				R=X[:,inds]-D@G[:,inds]+np.matmul(np.expand_dims(D[:,ik],1),np.expand_dims(G.data[p],0));
+				D[:,ik],G.data[p]=ksvd_atom(R,D[:,ik],G.data[p],update);
+			if dl_track(hist,D0,D,err,xnrm,param):
+				break;
+
+		# extra step
+		if 'final_coding' in param and not param['final_coding']:
+			G=None;		#D only, the caller codes the patches (e.g., chunk by chunk)
+		else:
+			G=ompN(D,X,T,eps,sparse=True,executor=pool);
+			if not ('sparse' in param and param['sparse']):
+				G=G.toarray();
+	finally:	#also on errors, so no worker processes are left running
+		if own:
+			pool.shutdown();
+
+	if 'history' in param and param['history']:
+		return D,G,hist
 	return D,G
 
 
@@ -76,67 +109,70 @@ def fast_ksvd(X,param):
 	Jan, 2020
 	Modified by Lucas Aires on Jan, 2026
 	
+	Since ksvd codes by batch OMP with Cholesky updates (ompN) as well,
+	fast_ksvd is ksvd; it is kept as its own learner for fast_ksvd_denoise
+	and for the dictionary-store keys (learner name 'fast_ksvd').
+	
 	INPUT
 	X:     input training samples
-	param: parameter struct
-	param.mode=1;   	#1: sparsity; 0: error
-	param.niter=10; 	#number of SGK iterations to perform; default: 10
-	param.D=DCT;    	#initial D
-	param.T=3;      	#sparsity level
+	param: parameter struct, as in ksvd
 	
 	OUTPUT
-	D:    learned dictionary
-	G:    sparse coefficients
+	D,G[,hist]: as in ksvd
 	
-	for X=DG
-	size of X: MxN
-	size of D: MxK
-	size of G: KxN
-		
 	DEMO
-	demos/test_pyseisdl_sgk3d.py
+	demos/test_pyseisdl_fast_ksvd_3d.py
+	"""
+	return ksvd(X,param)
+
+
+def ksvd_atom(R,d,g,update='svd'):
+	"""
+	ksvd_atom: rank-1 update of one atom and its coefficients
+	
+	INPUT
+	R:      residual without the atom, restricted to the patches using it (Mxn)
+	d:      current atom (M)
+	g:      current coefficients of the atom on these patches (n)
+	update: 'svd':    leading singular pair of R (K-SVD)
+	        'approx': one power iteration warm-started from the current
+	                  atom/coefficient pair, d=R*g/|R*g|, g=R^T*d (AK-SVD)
+	
+	OUTPUT
+	d,g:    updated atom and coefficients (unchanged if R is zero)
+	
+	Reference
+	Rubinstein, R., M. Zibulevsky, and M. Elad, 2008, Efficient implementation
+	of the K-SVD algorithm using batch orthogonal matching pursuit, Technical
+	Report CS-2008-08, Technion.
 	"""
-	import scipy.sparse.linalg
 	import scipy.linalg
+	import scipy.sparse.linalg
 	
-	T=param['T'];	#T=1	#requred by SGK
-	niter=param['niter'];
-	mode=param['mode'];
+	if update=='approx':
+		dn=np.matmul(R,g);
+		nrm=np.linalg.norm(dn);
+		if nrm==0:
+			return d,g
+		dn=dn/nrm;
+		return dn,np.matmul(R.T,dn)
 	
-	if 'K' in param:
-		K=param['K'];
+	if R.size>20000:
+		[u,s,v]=scipy.sparse.linalg.svds(R,1);
 	else:
-		K=param['D'].shape[1];	#dictionary size: number of atoms
-
-	D=param['D'][:,0:K].copy();
-	for iter in range(0,niter):
-		if mode==1:
-			G=omp_sparse_encode(D,X,T);
-		else:
-			pass;
-		
-		E0=X - np.matmul(D,G); #error before updating
-		for ik in range(0,K):	#KSVD iteration, K times SVD
-			E=E0+np.matmul(np.expand_dims(D[:,ik],1),np.expand_dims(G[ik,:],0));
-			inds,=np.where(G[ik,:]!=0);
-			R=E[:,inds];
-			if R.size>20000:
-				[u,s,v]=scipy.sparse.linalg.svds(R,1);
-			else:
-				[u,s,v]=scipy.linalg.svd(R);
-				
-			if u.size!=0:
-				D[:,ik]=u[:,0];
-				G[ik,inds]=s[0]*v[0,:];
-				
-	G=omp_sparse_encode(D,X,T);
+		[u,s,v]=scipy.linalg.svd(R);
 	
-	return D,G
-
+	#scipy.sparse.linalg.svds  ?
+	if u.size!=0:
+		return u[:,0],s[0]*v[0,:]
+	return d,g
 
 def omp_sparse_encode(D, X, T):
 	"""
-	Faster implementation of OMP
+	Faster implementation of OMP (scikit-learn based)
+	
+	Kept as an alternative coder; ksvd and fast_ksvd use ompN (batch OMP
+	with Cholesky updates, see omp.py), which does not require scikit-learn.
 	"""
 	from sklearn.decomposition import sparse_encode
 	
@@ -147,22 +183,6 @@ def omp_sparse_encode(D, X, T):
 	return G.T
 
 
-def ompN( D, X, K ):
-	"""
-	multi-column sparse coding
-	BY Yangkang Chen
-	Jan, 2020
-	"""
-	[n1,n2]=X.shape
-	[n1,n3]=D.shape
-	G=np.zeros([n3,n2]);
-
-	for i2 in range(0,n2):
-		G[:,i2]=omp0(D,X[:,i2],K);
-
-	return G
-
-
 def omp0( D, x, K ):
 	"""
 	omp0: Most basic orthogonal matching pursuit for sparse coding
@@ -0,0 +1,491 @@
+import numpy as np
+
+def batch_omp(D,X,T,DtD=None,DtX=None,eps=None,sparse=False,return_err=False):
+	"""
+	batch_omp: Batch orthogonal matching pursuit for multi-column sparse coding
+
+	All columns of X are coded together. The Gram matrix D^TD and the
+	projections D^TX are computed once, and the greedy atom selection and
+	least-squares update of every column are carried out as array operations
+	over the whole batch, so no Python loop runs over the patches.
+	The least-squares step grows a Cholesky factor of D_I^TD_I by one row per
+	selected atom and solves by triangular substitution (O(T^2) per atom)
+	instead of inverting D_I^TD_I at every step.
+	With eps given (error-constrained coding), a column stops as soon as its
+	residual norm falls below eps (or after T atoms), and finished columns
+	drop out of the active set.
+	Memory follows the atoms actually selected, not T: the Cholesky factors
+	are kept for the active columns only, and all work arrays grow (by
+	doubling) with the step count, so a large cap (e.g., T=M in mode 0) costs
+	O(Na*t^2) for the Na columns still active after t atoms.
+
+	INPUT
+	D:     dictionary (MxK), atoms are assumed to be normalized; dense, or a
+	       structured KronDict/SparseDict (see dictionary.py)
+	X:     input samples (MxN)
+	T:     sparsity level, the cap on the number of atoms per column (at most K)
+	DtD:   precomputed Gram matrix D^TD (KxK), optional
+	DtX:   precomputed projections D^TX (KxN), optional
+	eps:   residual bound |x-Dg|_2<=eps (scalar or length-N array), optional
+	sparse: if True, return G as a scipy.sparse CSC matrix (at most T
+	       nonzeros per column) instead of a dense array
+	return_err: if True, also return the squared residual norms
+
+	OUTPUT
+	G:     sparse coefficients (KxN)
+	err:   squared residual norm |x-Dg|_2^2 of each column (N), if return_err
+
+	for X=DG
+
+	Reference
+	Rubinstein, R., M. Zibulevsky, and M. Elad, 2008, Efficient implementation
+	of the K-SVD algorithm using batch orthogonal matching pursuit, Technical
+	Report CS-2008-08, Technion.
+
+	DEMO
+	demos/test_pyseisdl_sgk3d.py
+	"""
+	[n1,K]=D.shape;
+	N=X.shape[1];
+	dt=coef_dtype(D,X);				#working precision of the products and of G
+	if DtD is None:
+		DtD=dict_gram(D);	#the Gram solve is always in double
+	DtD=np.asarray(DtD,dtype=np.float64);
+	DtDw=DtD.astype(dt,copy=False);
+	if DtX is None:
+		DtX=dict_rdot(D,X);
+	DtX=DtX.astype(dt,copy=False);
+	T=min(T,K);
+
+	tcap=min(T,8);					#rows of I, g, L and y; doubled when more atoms are selected
+	I=np.zeros([tcap,N],dtype=int);	#selected atoms
+	g=np.zeros([tcap,N]);			#coefficients of the selected atoms
+	nsel=np.zeros(N,dtype=int);	#number of selected atoms per column
+	alpha=DtX.copy();				#D^T r, correlation between atoms and residuals
+	amax0=np.max(np.abs(DtX),axis=0) if N>0 else np.zeros(0);
+	act=np.arange(N);				#active columns
+	if eps is not None or return_err:
+		r2=np.sum(X*X,0,dtype=np.float64);	#squared residual norm, |x|^2-|y|^2
+	if eps is not None:
+		eps2=np.broadcast_to(np.power(eps,2),[N]);
+		act=act[r2>eps2];
+	#L and y are kept for the active columns only (row i of L and y is column act[i])
+	L=np.zeros([act.size,tcap,tcap]);	#Cholesky factors of D_I^TD_I, L[i]*L[i]^T=D_I^TD_I
+	y=np.zeros([act.size,tcap]);		#forward substitution L^{-1}D_I^Tx
+
+	for k in range(0,T):
+		if act.size==0:
+			break;
+		if k==tcap:
+			tcap=min(2*tcap,T);
+			I=np.concatenate((I,np.zeros([tcap-k,N],dtype=int)));
+			g=np.concatenate((g,np.zeros([tcap-k,N])));
+			L=np.pad(L,((0,0),(0,tcap-k),(0,tcap-k)));
+			y=np.pad(y,((0,0),(0,tcap-k)));
+		a=np.abs(alpha[:,act]);
+		if k>0:
+			a[I[0:k,act],np.arange(act.size)]=0;	#search among the other atoms
+		kk=np.argmax(a,axis=0);
+		amax=a[kk,np.arange(act.size)];
+		#stop the columns whose residual is orthogonal to all atoms
+		keep=amax>1e-12*amax0[act];
+		if not np.all(keep):
+			act=act[keep];kk=kk[keep];L=L[keep];y=y[keep];
+
+		#grow the Cholesky factor by one row: L_k=[L 0;w^T sqrt(d_k^Td_k-w^Tw)], L*w=D_I^Td_k
+		dkk=DtD[kk,kk];
+		if k>0:
+			w=trisolve(L[:,0:k,0:k],DtD[I[0:k,act].T,kk[:,None]]);
+			piv=dkk-np.sum(w*w,1);
+		else:
+			piv=dkk;
+		#stop the columns whose new atom is (numerically) dependent on the selected ones
+		keep=piv>1e-10*dkk;
+		if not np.all(keep):
+			act=act[keep];kk=kk[keep];piv=piv[keep];L=L[keep];y=y[keep];
+			if k>0:
+				w=w[keep];
+		if act.size==0:
+			break;
+		if k>0:
+			L[:,k,0:k]=w;
+		L[:,k,k]=np.sqrt(piv);
+		I[k,act]=kk;
+		nsel[act]=k+1;
+
+		#g_I = (D_I^TD_I)^{-1} D_I^Tx by one forward and one backward substitution
+		Ia=I[0:k+1,act].T;						#(Na,k+1)
+		y[:,k]=(DtX[kk,act]-np.sum(L[:,k,0:k]*y[:,0:k],1))/L[:,k,k];
+		gI=trisolve(L[:,0:k+1,0:k+1],y[:,0:k+1],trans=True);
+		g[0:k+1,act]=gI.T;
+		if eps is not None or return_err:
+			r2[act]=r2[act]-y[:,k]*y[:,k];
+		if eps is not None:
+			done=r2[act]<=eps2[act];
+			if np.any(done):
+				act=act[~done];Ia=Ia[~done];gI=gI[~done];L=L[~done];y=y[~done];
+
+		#alpha = D^Tx - D^TD_I g_I
+		tmp=DtX[:,act];
+		for j in range(0,k+1):
+			tmp=tmp-DtDw[:,Ia[:,j]]*gI[:,j].astype(dt);
+		alpha[:,act]=tmp;
+
+	g=g.astype(dt,copy=False);
+	if sparse:
+		G=sparse_coef(I,g,nsel,K);
+	else:
+		G=np.zeros([K,N],dtype=dt);
+		for k in range(0,I.shape[0]):
+			cols,=np.where(nsel>k);
+			G[I[k,cols],cols]=g[k,cols];
+
+	if return_err:
+		return G,np.maximum(r2,0)
+	return G
+
+def omp1(D,X,DtX=None,sparse=False,return_err=False):
+	"""
+	omp1: Vectorized single-atom sparse coding (T=1), as used by the SGK
+	training iterations
+	
+	For T=1 the OMP solution of every column is the atom with the largest
+	|d_k^Tx| and its projection coefficient d_k^Tx/d_k^Td_k, so all columns
+	are coded with one matrix product and one argmax.
+
+	INPUT
+	D:     dictionary (MxK)
+	X:     input samples (MxN)
+	DtX:   precomputed projections D^TX (KxN), optional
+	sparse: if True, return G as a scipy.sparse CSC matrix
+	return_err: if True, also return the squared residual norms
+
+	OUTPUT
+	G:     sparse coefficients (KxN), one nonzero per column
+	err:   squared residual norm |x-Dg|_2^2 of each column (N), if return_err
+
+	DEMO
+	demos/test_pyseisdl_omp1_benchmark.py
+	"""
+	[n1,K]=D.shape;
+	N=X.shape[1];
+	if DtX is None:
+		DtX=dict_rdot(D,X);
+	k=np.argmax(np.abs(DtX),axis=0);
+	cols=np.arange(N);
+	dd=np.diag(D.gram())[k] if hasattr(D,'gram') else np.sum(D*D,0)[k];
+	g=(DtX[k,cols]/dd).astype(coef_dtype(D,X),copy=False);
+	if sparse:
+		G=sparse_coef(k[None,:],g[None,:],(g!=0).astype(int),K);
+	else:
+		G=np.zeros([K,N],dtype=g.dtype);
+		G[k,cols]=g;
+	
+	if return_err:
+		r2=np.sum(X*X,0,dtype=np.float64)-np.power(DtX[k,cols],2,dtype=np.float64)/dd;
+		return G,np.maximum(r2,0)
+	return G
+
+def dict_gram(D):
+	"""
+	dict_gram: Gram matrix D^TD in double precision, for a dense or a
+	structured dictionary (KronDict, SparseDict, see dictionary.py)
+	"""
+	if hasattr(D,'gram'):
+		return np.asarray(D.gram(),dtype=np.float64)
+	return np.matmul(D.T.astype(np.float64),D.astype(np.float64))
+
+def dict_rdot(D,X):
+	"""
+	dict_rdot: projections D^TX for a dense or a structured dictionary
+	"""
+	if hasattr(D,'rdot'):
+		return D.rdot(X)
+	return np.matmul(D.T,X)
+
+def coef_dtype(D,X):
+	"""
+	coef_dtype: floating type of the coefficients for dictionary D and samples X
+	
+	float32 when both are float32 (single-precision mode), float64 otherwise.
+	"""
+	dt=np.result_type(D.dtype,X.dtype);
+	if dt!=np.float32:
+		dt=np.dtype(np.float64);
+	return dt
+
+def sparse_coef(I,g,nsel,K):
+	"""
+	sparse_coef: assemble OMP output into a CSC coefficient matrix
+	
+	INPUT
+	I:     selected atoms (TxN), the first nsel[n] entries of column n are used
+	g:     coefficients of the selected atoms (TxN)
+	nsel:  number of selected atoms per column (N)
+	K:     number of atoms
+	
+	OUTPUT
+	G:     scipy.sparse.csc_matrix (KxN)
+	"""
+	import scipy.sparse
+	N=nsel.size;
+	used=(np.arange(I.shape[0])[None,:]<nsel[:,None]);	#(N,T), column-major order of the nonzeros
+	indptr=np.concatenate(([0],np.cumsum(nsel)));
+	return scipy.sparse.csc_matrix((g.T[used],I.T[used],indptr),shape=(K,N))
+
+def atom_support(G):
+	"""
+	atom_support: atom-to-patch support index of a CSC coefficient matrix
+	
+	Patches (columns) that use atom ik are cols[ptr[ik]:ptr[ik+1]] (in
+	increasing order), and their coefficients are G.data[pos[ptr[ik]:ptr[ik+1]]],
+	which can be updated in place.
+	
+	INPUT
+	G:     scipy.sparse.csc_matrix (KxN)
+	
+	OUTPUT
+	ptr:   index pointer (K+1)
+	cols:  column (patch) index of each nonzero, grouped by atom
+	pos:   position of each nonzero in G.data, grouped by atom
+	"""
+	K=G.shape[0];
+	pos=np.argsort(G.indices,kind='stable');
+	cols=np.repeat(np.arange(G.shape[1]),np.diff(G.indptr))[pos];
+	ptr=np.concatenate(([0],np.cumsum(np.bincount(G.indices,minlength=K))));
+	return ptr,cols,pos
+
+def trisolve(L,b,trans=False):
+	"""
+	trisolve: batched triangular substitution
+	
+	INPUT
+	L:     stack of lower-triangular matrices (NxkXk)
+	b:     stack of right-hand sides (Nxk)
+	trans: False: solve L*x=b (forward); True: solve L^T*x=b (backward)
+	
+	OUTPUT
+	x:     solutions (Nxk)
+	"""
+	k=b.shape[1];
+	x=np.zeros(b.shape);
+	if not trans:
+		for i in range(0,k):
+			x[:,i]=(b[:,i]-np.sum(L[:,i,0:i]*x[:,0:i],1))/L[:,i,i];
+	else:
+		for i in range(k-1,-1,-1):
+			x[:,i]=(b[:,i]-np.sum(L[:,i+1:k,i]*x[:,i+1:k],1))/L[:,i,i];
+	return x
+
+def omp_eps(X,param):
+	"""
+	omp_eps: residual bound for the error-constrained sparse coding (param['mode']=0)
+	
+	eps=C*sigma*sqrt(M), with M the patch size and sigma the noise level,
+	estimated from X when not given (Elad and Aharon, 2006).
+	
+	INPUT
+	X:     input samples (MxN)
+	param: parameter struct
+	  param.eps=eps;		#residual bound per patch (overrides sigma and C)
+	  param.sigma=sigma;	#noise standard deviation; default: estimated from X
+	  param.C=1.15;		#gain factor of the bound; default: 1.15
+	
+	OUTPUT
+	eps:   residual bound |x-Dg|_2<=eps
+	"""
+	if 'eps' in param:
+		return param['eps']
+	if 'sigma' in param:
+		sigma=param['sigma'];
+	else:
+		sigma=noise_sigma(X);
+	C=param['C'] if 'C' in param else 1.15;
+	return C*sigma*np.sqrt(X.shape[0])
+
+def noise_param(din,param):
+	"""
+	noise_param: parameter struct with the noise level of the data set once
+	
+	For the error-constrained coding (param.mode=0) without param.eps or
+	param.sigma, sigma is estimated once from the data (noise_sigma along
+	its first axis) and put in a copy of param, so that the learning and
+	the coding, in memory or chunk by chunk, all use the same bound.
+	
+	INPUT
+	din:   input data
+	param: parameter struct
+	
+	OUTPUT
+	param: param, or a copy of it with param.sigma
+	"""
+	if not ('mode' in param and param['mode']!=1) or 'eps' in param or 'sigma' in param:
+		return param
+	par=dict(param);
+	par['sigma']=noise_sigma(np.reshape(din,[din.shape[0],-1]));
+	return par
+
+def noise_sigma(X):
+	"""
+	noise_sigma: robust estimate of the standard deviation of white noise in X
+	
+	Median absolute deviation of the first differences along the fastest
+	patch axis (for white noise their variance is 2*sigma^2). Exact zeros
+	(muted or padded samples) are left out of the estimate.
+	
+	INPUT
+	X:     input samples (MxN)
+	
+	OUTPUT
+	sigma: noise standard deviation
+	"""
+	d=np.diff(X,axis=0);
+	d=d[d!=0];
+	if d.size==0:
+		return 0.0
+	return np.median(np.abs(d-np.median(d)))/0.6745/np.sqrt(2)
+
+def omp_executor(param):
+	"""
+	omp_executor: process pool for the sharded sparse coding, from the parameter struct
+	
+	INPUT
+	param: parameter struct
+	  param.n_jobs=1;	#number of worker processes (-1: all CPU cores); default: 1
+	  param.executor=pool;	#an existing concurrent.futures executor to use instead
+	
+	OUTPUT
+	executor: the executor, or None for serial coding
+	own:      True if the executor was created here (the caller shuts it down)
+	"""
+	import os
+	n_jobs=param['n_jobs'] if 'n_jobs' in param else 1;
+	if 'executor' in param and param['executor'] is not None:
+		return param['executor'],False
+	if n_jobs==-1:
+		n_jobs=os.cpu_count();
+	if n_jobs is None or n_jobs<=1:
+		return None,False
+	from concurrent.futures import ProcessPoolExecutor
+	return ProcessPoolExecutor(max_workers=n_jobs),True
+
+def omp_shard(executor,D,X,T,eps=None,sparse=False,nblock=None,return_err=False):
+	"""
+	omp_shard: sparse coding of column blocks of X in parallel
+	
+	X is split into contiguous column blocks which are coded independently
+	(by omp1 for T=1 without eps, by batch_omp otherwise) on the executor;
+	the blocks are put back together in their original order, so the result
+	is identical to the serial one.
+	
+	INPUT
+	executor: concurrent.futures executor (e.g., from omp_executor)
+	D,X,T,eps,sparse,return_err: as in batch_omp
+	nblock:   number of column blocks; default: 4 per CPU core
+	
+	OUTPUT
+	G:     sparse coefficients (KxN), dense or scipy.sparse CSC
+	err:   squared residual norms (N), if return_err
+	"""
+	import os
+	N=X.shape[1];
+	if nblock is None:
+		nblock=4*(os.cpu_count() or 1);
+	nblock=max(1,min(nblock,N));
+	edges=np.linspace(0,N,nblock+1).astype(int);
+	DtD=dict_gram(D);
+	futs=[];
+	for ib in range(0,nblock):
+		i0=edges[ib];i1=edges[ib+1];
+		e=eps if (eps is None or np.ndim(eps)==0) else eps[i0:i1];
+		futs.append(executor.submit(omp_block,D,X[:,i0:i1],T,e,sparse,DtD,return_err));
+	res=[f.result() for f in futs];
+	Gs=[r[0] for r in res] if return_err else res;
+	if sparse:
+		import scipy.sparse
+		G=scipy.sparse.hstack(Gs,format='csc');
+	else:
+		G=np.concatenate(Gs,axis=1);
+	if return_err:
+		return G,np.concatenate([r[1] for r in res])
+	return G
+
+def omp_block(D,X,T,eps,sparse,DtD,return_err=False):
+	"""
+	omp_block: code one column block (worker of omp_shard)
+	"""
+	if T==1 and eps is None:
+		return omp1(D,X,sparse=sparse,return_err=return_err)
+	return batch_omp(D,X,T,DtD=DtD,eps=eps,sparse=sparse,return_err=return_err)
+
+def dl_track(hist,D0,D,err,xnrm,param):
+	"""
+	dl_track: record one dictionary-learning iteration and test for convergence
+	
+	The representation error is taken from the sparse coding step of the
+	iteration (err from ompN(...,return_err=True)), so it costs nothing extra.
+	
+	INPUT
+	hist:  history struct, hist['err'] and hist['dchange'] are appended
+	D0:    dictionary before the update
+	D:     dictionary after the update
+	err:   squared residual norms of the coding step (N)
+	xnrm:  |X|_F, to normalize the error
+	param: parameter struct
+	  param.tol=tol;	#stop when the relative change of the error is below tol
+	  param.dtol=dtol;	#stop when |D-D0|_F/|D0|_F is below dtol
+	
+	OUTPUT
+	True when one of the tolerances is met
+	"""
+	e=np.sqrt(np.sum(err))/xnrm if xnrm>0 else 0.0;
+	dchange=np.linalg.norm(D-D0)/max(np.linalg.norm(D0),np.finfo(float).tiny);
+	hist['err'].append(e);
+	hist['dchange'].append(dchange);
+	if 'tol' in param and len(hist['err'])>1:
+		e0=hist['err'][-2];
+		if abs(e0-e)<=param['tol']*e0:
+			return True
+	if 'dtol' in param and dchange<=param['dtol']:
+		return True
+	return False
+
+def dl_code(D,X,param,executor=None):
+	"""
+	dl_code: sparse coding of X with a fixed dictionary, set up from the
+	parameter struct of the learners (sgk, ksvd, fast_ksvd)
+	
+	INPUT
+	D:     dictionary (MxK)
+	X:     input samples (MxN)
+	param: parameter struct (mode, T, sigma/eps, sparse, n_jobs, dtype as in sgk)
+	executor: executor for parallel coding; default: from param (omp_executor)
+	
+	OUTPUT
+	G:     sparse coefficients (KxN), scipy.sparse CSC if param['sparse'] else dense
+	"""
+	if param['mode']==1:
+		T=param['T'];
+		eps=None;
+	else:
+		T=param['T'] if 'T' in param else X.shape[0];
+		eps=omp_eps(X,param);
+	if 'dtype' in param:
+		X=X.astype(param['dtype'],copy=False);
+		D=D.astype(param['dtype'],copy=False);
+	own=False;
+	if executor is None:
+		executor,own=omp_executor(param);
+	try:
+		if executor is not None:
+			G=omp_shard(executor,D,X,T,eps,sparse=True);
+		elif T==1 and eps is None:
+			G=omp1(D,X,sparse=True);
+		else:
+			G=batch_omp(D,X,T,eps=eps,sparse=True);
+	finally:
+		if own:
+			executor.shutdown();
+	if not ('sparse' in param and param['sparse']):
+		G=G.toarray();
+	return G
@@ -0,0 +1,107 @@
+import numpy as np
+def odl(blocks,param):
+	"""
+	odl: online dictionary learning from a stream of patch blocks
+
+	The dictionary is learned from an iterator of patch blocks instead of the
+	whole patch matrix. Each block is sparse coded with the current dictionary,
+	accumulated into the sufficient statistics A=sum(G*G^T) (KxK) and
+	B=sum(X*G^T) (MxK), and then used for one block-coordinate update of the
+	atoms. Memory is bounded by one block plus D, A and B, whatever the length
+	of the stream.
+
+	INPUT
+	blocks: iterable (e.g., a generator) of patch blocks, each of size Mxnb
+	param:  parameter struct
+	  param.mode=1;   	#1: sparsity; 0: error
+	  param.D=DCT;    	#initial D
+	  param.T=3;      	#sparsity level (cap on the atoms per patch when mode=0; default: M)
+	  param.K=K;       	#number of atoms; default: param.D.shape[1]
+	  param.niter=1;  	#dictionary update sweeps per block; default: 1
+	  param.beta=1;   	#forgetting factor of A and B (<1 forgets old blocks); default: 1
+	  param.nblock=n; 	#stop after n blocks; default: until the stream ends
+	  param.A,param.B;	#statistics from a previous run, to resume; optional
+	  param.sigma=sigma;	#noise level for mode=0 (see omp_eps)
+	  param.dtype=np.float32;	#floating type of D; default: as given
+
+	OUTPUT
+	D:      learned dictionary (MxK)
+	A,B:    sufficient statistics (pass them back through param to resume)
+
+	Reference
+	Mairal, J., F. Bach, J. Ponce, and G. Sapiro, 2010, Online learning for
+	matrix factorization and sparse coding, Journal of Machine Learning
+	Research, 11, 19-60.
+
+	EXAMPLE
+	from pyseisdl.online import odl
+	from pyseisdl.patch import patch3d
+	X=patch3d(din,l1,l2,l3,s1,s2,s3)[:,:,0].T
+	D,A,B=odl((X[:,i:i+5000] for i in range(0,X.shape[1],5000)),param)
+	"""
+	from .omp import batch_omp,omp_eps
+	from .dictionary import dict_dense
+
+	mode=param['mode'];
+	if 'K' in param:
+		K=param['K'];
+	else:
+		K=param['D'].shape[1];	#dictionary size: number of atoms
+	niter=param['niter'] if 'niter' in param else 1;
+	beta=param['beta'] if 'beta' in param else 1.0;
+	nblock=param['nblock'] if 'nblock' in param else None;
+
+	D=dict_dense(param['D'])[:,0:K].copy();	#a structured param.D (KronDict, SparseDict) is learned in dense form
+	if 'dtype' in param:
+		D=D.astype(param['dtype'],copy=False);
+	[M,K]=D.shape;
+	A=param['A'].copy() if 'A' in param else np.zeros([K,K]);
+	B=param['B'].copy() if 'B' in param else np.zeros([M,K]);
+
+	ib=0;
+	for X in blocks:
+		if nblock is not None and ib>=nblock:
+			break;
+		ib=ib+1;
+		X=np.asarray(X,dtype=D.dtype);
+		if X.shape[1]==0:
+			continue;
+		if mode==1:
+			G=batch_omp(D,X,param['T'],sparse=True);
+		else:
+			T=param['T'] if 'T' in param else M;
+			G=batch_omp(D,X,T,eps=omp_eps(X,param),sparse=True);
+
+		A=beta*A+(G@G.T).toarray();
+		B=beta*B+X@G.T;
+
+		for it in range(0,niter):
+			D=odl_update(D,A,B);
+
+	return D,A,B
+
+def odl_update(D,A,B):
+	"""
+	odl_update: block-coordinate dictionary update from the sufficient statistics
+
+	u_j=(b_j-D*a_j)/A_jj+d_j, d_j=u_j/|u_j|, for j=1...K; atoms that have not
+	been used yet (A_jj=0) are kept.
+
+	INPUT
+	D:     current dictionary (MxK)
+	A:     sum of G*G^T (KxK)
+	B:     sum of X*G^T (MxK)
+
+	OUTPUT
+	D:     updated dictionary (MxK)
+	"""
+	D=D.copy();
+	K=D.shape[1];
+	for j in range(0,K):
+		if A[j,j]<=0:
+			continue;
+		u=(B[:,j]-np.matmul(D,A[:,j]))/A[j,j]+D[:,j];
+		nrm=np.linalg.norm(u);
+		if nrm>0:
+			D[:,j]=u/nrm;
+	return D
@@ -1,5 +1,6 @@
 import numpy as np
-def patch2d(A,l1=8,l2=8,s1=4,s2=4,mode=1):
+import functools
+def patch2d(A,l1=8,l2=8,s1=4,s2=4,mode=1,geom=None):
 	"""
 	patch2d: decompose the image into patches:
 	
@@ -10,9 +11,10 @@ def patch2d(A,l1=8,l2=8,s1=4,s2=4,mode=1):
 	s1: first shifting size
 	s2: second shifting size
 	mode: patching mode
+	geom: PatchGeometry (see patch_geometry) of these sizes, to skip the setup; optional
 	
 	OUTPUT
-	X: patches
+	X: patches (npatch x l1*l2), a transposed view of a contiguous (l1*l2 x npatch) array
 	
 	HISTORY
 	by Yangkang Chen
@@ -59,37 +61,22 @@ def patch2d(A,l1=8,l2=8,s1=4,s2=4,mode=1):
 	EXAMPLE 3
 	sgk_denoise() in pyseisdl/denoise.py
 	"""
-	[n1,n2]=A.shape;
-
 	if mode==1: 	#possible for other patching options
-		
-		tmp=np.mod(n1-l1,s1);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros([s1-tmp,n2])),axis=0); 
-		tmp=np.mod(n2-l2,s2);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros([A.shape[0],s2-tmp])),axis=1); 
-		
-		[N1,N2]=A.shape;
-		X=[]
-		for i1 in range(0,N1-l1+1,s1):
-			for i2 in range(0,N2-l2+1,s2):
-						tmp=np.reshape(A[i1:i1+l1,i2:i2+l2],(l1*l2,1),order='F');
-						X.append(tmp)
-		X = np.array(X)
+		X=patchnd(A,[l1,l2],[s1,s2],geom=geom);	#(l1*l2,npatch), C-contiguous
 	else:
 		#not written yet
 		pass;
-	return X[:,:,0]
+	return X.T		#(npatch,l1*l2) view; X.T of it is the (npix,npatch) matrix without a copy
 
 
-def patch3d(A,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1):
+def patch3d(A,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1,geom=None):
 	"""
 	patch3d: decompose 3D data into patches:
 	
 	INPUT
 	D: input image
 	mode: patching mode
+	geom: PatchGeometry (see patch_geometry) of these sizes, to skip the setup; optional
 	l1: first patch size
 	l2: second patch size
 	l3: third patch size
@@ -98,7 +85,7 @@ def patch3d(A,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1):
 	s3: third shifting size
 	
 	OUTPUT
-	X: patches
+	X: patches (npatch x l1*l2*l3 x 1), a view of a contiguous (l1*l2*l3 x npatch) array
 	
 	HISTORY
 	by Yangkang Chen
@@ -173,45 +160,235 @@ def patch3d(A,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1):
 	sgk_denoise() in pyseisdl/denoise.py
 	"""
 
-	[n1,n2,n3]=A.shape;
-
 	if mode==1: 	#possible for other patching options
-	
-		tmp=np.mod(n1-l1,s1);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros([s1-tmp,n2,n3])),axis=0);
-
-		tmp=np.mod(n2-l2,s2);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros([A.shape[0],s2-tmp,n3])),axis=1);
-
-		tmp=np.mod(n3-l3,s3);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros([A.shape[0],A.shape[1],s3-tmp])),axis=2);	#concatenate along the third dimension
-
-		[N1,N2,N3]=A.shape;
-		X=[]
-		for i1 in range(0,N1-l1+1,s1):
-			for i2 in range(0,N2-l2+1,s2):
-				for i3 in range(0,N3-l3+1,s3):
-						tmp=np.reshape(A[i1:i1+l1,i2:i2+l2,i3:i3+l3],[l1*l2*l3,1],order='F');
-						X.append(tmp)
-		X = np.array(X)				
-						
+		X=patchnd(A,[l1,l2,l3],[s1,s2,s3],geom=geom);	#(l1*l2*l3,npatch), C-contiguous
 	else:
 		#not written yet
 		pass;
+	return X.T[:,:,None]	#(npatch,l1*l2*l3,1) view; X[:,:,0].T is the (npix,npatch) matrix without a copy
+
+
+class PatchGeometry:
+	"""
+	PatchGeometry: patching plan of N-D data of size n with patches l and
+	shifts s, shared by patchnd and patchnd_inv
+	
+	It holds everything that depends only on (n,l,s): the padding, the
+	number of patches, the strided gather/scatter slices of every pixel
+	offset inside the patch, and the inverse fold weights (per axis, the
+	fold is separable). Build it with patch_geometry(n,l,s), which caches the
+	plans, and pass it as geom to the patch functions and param['geom'] to
+	the denoisers; repeated gathers of the same size then skip the setup.
+	
+	INPUT
+	n:    data size [n1,n2,...]
+	l:    patch sizes [l1,l2,...]
+	s:    shifting sizes [s1,s2,...] (s<=0 is taken as 1)
+	
+	EXAMPLE
+	geom=patch_geometry(d.shape,[4,4,4],[2,2,2])
+	X=patchnd(d,geom=geom)			#(64 x npatch)
+	d2=patchnd_inv(X,geom=geom)
+	"""
+	def __init__(self,n,l,s):
+		l=[int(li) for li in l];
+		n=[int(ni) for ni in n]+[1]*(len(l)-len(n));	#missing trailing axes are of size 1
+		s=[max(int(si),1) for si in s];
+		d=len(l);
+		self.n=tuple(n);self.l=tuple(l);self.s=tuple(s);
+		self.pad=tuple((s[i]-np.mod(n[i]-l[i],s[i]))%s[i] for i in range(0,d));
+		self.N=tuple(n[i]+self.pad[i] for i in range(0,d));		#padded size
+		self.P=tuple((self.N[i]-l[i])//s[i]+1 for i in range(0,d));	#patches along each axis
+		self.npix=int(np.prod(l));
+		self.npatch=int(np.prod(self.P));
+		self.crop=tuple(slice(0,ni) for ni in n);
+		self.steps=tuple(slice(None,None,si) for si in s);
+		#scatter: one strided slab per pixel offset inside the patch, in the row order of X
+		self.offs=list(np.ndindex(*l));
+		#fold: along axis i, sample x is covered by patches k with k*s<=x<k*s+l
+		self.wfold=[];
+		for i in range(0,d):
+			x=np.arange(self.N[i]);
+			c=np.minimum(x//s[i],self.P[i]-1)-np.maximum(-((l[i]-1-x)//s[i]),0)+1;
+			self.wfold.append(np.reshape(1.0/c,[-1 if j==i else 1 for j in range(0,d)]));
+	
+	def check(self,n=None,l=None,s=None):
+		"""check: raise ValueError unless the plan is the one of data size n, patch sizes l and shifting sizes s (those given)"""
+		d=len(self.l);
+		for name,v,w,f in (('data size',n,self.n,int),('patch sizes',l,self.l,int),('shifting sizes',s,self.s,lambda si:max(int(si),1))):
+			if v is None:
+				continue;
+			v=tuple(f(vi) for vi in v);
+			if len(v)>d or v+(1,)*(d-len(v))!=w:
+				raise ValueError('the patch geometry %s does not match the %s %s'%(str(list(w)),name,str(list(v))));
+		return self
+	
+	def extract(self,A):
+		"""extract: patches of A (npix x npatch), C-contiguous"""
+		return self.gather(self.windows(A))
+	
+	def fold(self,X):
+		"""fold: overlap-add of the patches X (npix x npatch), averaged"""
+		if X.shape!=(self.npix,self.npatch):
+			raise ValueError('patches of size %s do not match the patch geometry (%d,%d)'%(str(X.shape),self.npix,self.npatch));
+		dt=X.dtype if np.issubdtype(X.dtype,np.inexact) else np.float64;	#integer patches are averaged in double
+		A=np.zeros(self.N,dtype=dt);
+		self.scatter(A,X);
+		return self.normalize(A)
+	
+	#chunked access, for streaming: a chunk is a box of patches (one slice per
+	#patch axis) covering a contiguous range q0:q1 of the patch order
+	def chunks(self,n):
+		"""
+		chunks: boxes of at most n patches covering all patches in order,
+		as a list of (q0,q1,box), box the slices of the patch axes
+		(for n below the patches of one row, rows are split along the
+		next axes, down to single patches)
+		"""
+		import itertools
 		
+		n=max(int(n),1);
+		d=len(self.P);
+		k=0;
+		while int(np.prod(self.P[k+1:]))>n:	#split along axis k, keep the axes after it whole
+			k=k+1;
+		unit=int(np.prod(self.P[k+1:]));
+		m=max(n//unit,1);
+		out=[];
+		q=0;
+		for pre in itertools.product(*[range(0,Pi) for Pi in self.P[0:k]]):
+			for j in range(0,self.P[k],m):
+				j1=min(j+m,self.P[k]);
+				box=tuple(slice(i,i+1) for i in pre)+(slice(j,j1),)+tuple(slice(0,Pi) for Pi in self.P[k+1:d]);
+				out.append((q,q+(j1-j)*unit,box));
+				q=q+(j1-j)*unit;
+		return out
+	
+	def windows(self,A):
+		"""windows: all patches of A as a strided view (P1,...,Pd,l1,...,ld), after padding A once"""
+		from numpy.lib.stride_tricks import sliding_window_view
+		
+		A=np.reshape(A,list(A.shape)+[1]*(len(self.l)-np.ndim(A)));
+		if A.shape!=self.n:
+			raise ValueError('data of size %s does not match the patch geometry %s'%(str(A.shape),str(self.n)));
+		if any(self.pad):
+			Ap=np.zeros(self.N,dtype=A.dtype);
+			Ap[self.crop]=A;
+			A=Ap;
+		return sliding_window_view(A,self.l)[self.steps]
+	
+	def gather(self,W,box=None):
+		"""gather: patches of the box of the windows W (npix x patches in the box), C-contiguous; default: all"""
+		d=len(self.l);
+		if box is not None:
+			W=W[box];
+		W=W.transpose(list(range(2*d-1,d-1,-1))+list(range(0,d)));	#(ld,...,l1,box sizes)
+		return W.reshape(self.npix,-1)
+	
+	def scatter(self,A,X,box=None):
+		"""scatter: add the patches X of the box into the padded accumulator A (of size N); default: all"""
+		d=len(self.l);
+		b=[(0,Pi) for Pi in self.P] if box is None else [box[i].indices(self.P[i])[0:2] for i in range(0,d)];
+		Y=np.reshape(X,self.l[::-1]+tuple(e-a for a,e in b));	#no copy for a contiguous X
+		s=self.s;
+		for off in self.offs:
+			sl=tuple(slice(off[i]+s[i]*b[i][0],off[i]+s[i]*(b[i][1]-1)+1,s[i]) for i in range(0,d));
+			A[sl]+=Y[off[::-1]];
+		return A
+	
+	def normalize(self,A):
+		"""normalize: divide the accumulated A (of size N, floating) by the fold, in place, and crop it to n"""
+		for w in self.wfold:
+			A*=w.astype(np.result_type(A.dtype,np.float32),copy=False);	#never truncated to an integer type
+		return A[self.crop]
+
+@functools.lru_cache(maxsize=64)
+def _patch_geometry(n,l,s):
+	return PatchGeometry(n,l,s)
+
+def patch_geometry(n,l,s):
+	"""
+	patch_geometry: cached PatchGeometry for data size n, patch sizes l and
+	shifting sizes s (the same plan object is returned for the same sizes)
+	"""
+	return _patch_geometry(tuple(int(ni) for ni in n),tuple(int(li) for li in l),tuple(int(si) for si in s))
+
+def patchnd(A,l=None,s=None,mode=1,geom=None):
+	"""
+	patchnd: decompose N-D data (any rank) into patches
+	
+	The array is padded with zeros once (when n-l is not a multiple of s),
+	the patches are taken as strided views (sliding_window_view) and
+	gathered by a single copy. Patches are ordered with the first axis
+	slowest, and the pixels of a patch in Fortran order, as in patch2d and
+	patch3d.
+	
+	INPUT
+	A:    N-D array; missing trailing axes (len(l)>A.ndim) are taken as size 1
+	l:    patch sizes [l1,l2,...]
+	s:    shifting sizes [s1,s2,...] (s<=0 is taken as 1, e.g., s5=0 when n5=1)
+	mode: patching mode
+	geom: PatchGeometry (see patch_geometry), replaces l and s (ValueError
+	      if l or s are also given and differ); optional
+	
+	OUTPUT
+	X:    patches (l1*l2*... x npatch), C-contiguous
+	
+	EXAMPLE
+	X=patchnd(d5,[4,4,4,4,1],[2,2,2,2,0])	#5D prestack data, (256 x npatch)
+	"""
+	if mode==1: 	#possible for other patching options
+		if geom is None:
+			geom=patch_geometry(list(np.shape(A))+[1]*(len(l)-np.ndim(A)),l,s);
+		else:
+			geom.check(None,l,s);
+		X=geom.extract(A);
+	else:
+		#not written yet
+		pass;
 	return X
 
+def patchnd_inv(X,n=None,l=None,s=None,mode=1,geom=None):
+	"""
+	patchnd_inv: insert patches into N-D data (any rank), averaging the
+	overlaps (the inverse of patchnd)
+	
+	The patches are added with one strided slab per pixel offset inside the
+	patch (l1*l2*... vectorized adds instead of one add per patch), and the
+	sum is multiplied by the inverse fold (number of patches covering each
+	sample), which is separable and known in closed form from the geometry.
+	
+	INPUT
+	X:    patches (l1*l2*... x npatch), as from patchnd
+	n:    data size [n1,n2,...]
+	l:    patch sizes [l1,l2,...]
+	s:    shifting sizes [s1,s2,...] (s<=0 is taken as 1)
+	mode: patching mode
+	geom: PatchGeometry (see patch_geometry), replaces n, l and s (ValueError
+	      if they are also given and differ); optional
+	
+	OUTPUT
+	A:    N-D array of size n
+	"""
+	if mode==1: 	#possible for other patching options
+		if geom is None:
+			geom=patch_geometry(n,l,s);
+		else:
+			geom.check(n,l,s);
+		A=geom.fold(X);
+	else:
+		#not written yet
+		pass;
+	return A
 
-def patch2d_inv(X,n1,n2,l1=8,l2=8,s1=4,s2=4,mode=1):
+def patch2d_inv(X,n1,n2,l1=8,l2=8,s1=4,s2=4,mode=1,geom=None):
 	"""
 	patch2d_inv: insert patches into the image
 	
 	INPUT
 	D: input patches (sample,patchsize)
 	mode: patching mode
+	geom: PatchGeometry (see patch_geometry) of these sizes, to skip the setup; optional
 	l1: first patch size
 	l2: second patch size
 	s1: first shifting size
@@ -268,49 +445,21 @@ def patch2d_inv(X,n1,n2,l1=8,l2=8,s1=4,s2=4,mode=1):
 	"""
 
 	if mode==1: 	#possible for other patching options
-
-		tmp1=np.mod(n1-l1,s1);
-		tmp2=np.mod(n2-l2,s2);
-		if tmp1!=0 and tmp2!=0:
-			A=np.zeros([n1+s1-tmp1,n2+s2-tmp2]); 
-			mask=np.zeros([n1+s1-tmp1,n2+s2-tmp2]); 
-
-		if tmp1!=0 and tmp2==0:
-			A=np.zeros([n1+s1-tmp1,n2]); 
-			mask=np.zeros([n1+s1-tmp1,n2]);
-
-		if tmp1==0 and tmp2!=0:
-			A=np.zeros([n1,n2+s2-tmp2]);   
-			mask=np.zeros([n1,n2+s2-tmp2]);   
-
-
-		if tmp1==0 and tmp2==0:
-			A=np.zeros([n1,n2]); 
-			mask=np.zeros([n1,n2]);
-
-		[N1,N2]=A.shape;
-		id=-1;
-		for i1 in range(0,N1-l1+1,s1):
-			for i2 in range(0,N2-l2+1,s2):
-				id=id+1;
-				A[i1:i1+l1,i2:i2+l2]=A[i1:i1+l1,i2:i2+l2]+np.reshape(X[id,:],[l1,l2],order='F');
-				mask[i1:i1+l1,i2:i2+l2]=mask[i1:i1+l1,i2:i2+l2]+np.ones([l1,l2]);
-
-		A=A/mask; 
-		A=A[0:n1,0:n2];
+		A=patchnd_inv(X.T,[n1,n2],[l1,l2],[s1,s2],geom=geom);
 	else:
 		#not written yet
 		pass;
 	return A
 
 
-def patch3d_inv( X,n1,n2,n3,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1):
+def patch3d_inv( X,n1,n2,n3,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1,geom=None):
 	"""
 	patch3d_inv: insert patches into the 3D data
 	
 	INPUT
 	D: input image
 	mode: patching mode
+	geom: PatchGeometry (see patch_geometry) of these sizes, to skip the setup; optional
 	n1: first dimension size
 	n1: second dimension size
 	n3: third dimension size
@@ -400,58 +549,21 @@ def patch3d_inv( X,n1,n2,n3,l1=4,l2=4,l3=4,s1=2,s2=2,s3=2,mode=1):
 	"""
 
 	if mode==1: 	#possible for other patching options
-	
-		tmp1=np.mod(n1-l1,s1);
-		tmp2=np.mod(n2-l2,s2);
-		tmp3=np.mod(n3-l3,s3);
-		if tmp1!=0 and tmp2!=0 and tmp3!=0:
-			A=np.zeros([n1+s1-tmp1,n2+s2-tmp2,n3+s3-tmp3]);
-			mask=np.zeros([n1+s1-tmp1,n2+s2-tmp2,n3+s3-tmp3]);
-
-		if tmp1!=0 and tmp2!=0 and tmp3==0:
-			A=np.zeros([n1+s1-tmp1,n2+s2-tmp2,n3]);
-			mask=np.zeros([n1+s1-tmp1,n2+s2-tmp2,n3]);
-	
-		if tmp1!=0 and tmp2==0 and tmp3==0:
-			A=np.zeros([n1+s1-tmp1,n2,n3]);
-			mask=np.zeros([n1+s1-tmp1,n2,n3]);
-	
-		if tmp1==0 and tmp2!=0 and tmp3==0:
-			A=np.zeros([n1,n2+s2-tmp2,n3]);
-			mask=np.zeros([n1,n2+s2-tmp2,n3]);
-	
-		if tmp1==0 and tmp2==0 and tmp3!=0:
-			A=np.zeros([n1,n2,n3+s3-tmp3]);
-			mask=np.zeros([n1,n2,n3+s3-tmp3]);
-	
-		if tmp1==0 and tmp2==0  and tmp3==0:
-			A=np.zeros([n1,n2,n3]);
-			mask=np.zeros([n1,n2,n3]);
-	
-		[N1,N2,N3]=A.shape;
-		id=-1;
-		for i1 in range(0,N1-l1+1,s1):
-			for i2 in range(0,N2-l2+1,s2):
-				for i3 in range(0,N3-l3+1,s3):
-					id=id+1;
-					A[i1:i1+l1,i2:i2+l2,i3:i3+l3]=A[i1:i1+l1,i2:i2+l2,i3:i3+l3]+np.reshape(X[id,:],[l1,l2,l3],order='F');
-					mask[i1:i1+l1,i2:i2+l2,i3:i3+l3]=mask[i1:i1+l1,i2:i2+l2,i3:i3+l3]+np.ones([l1,l2,l3]);
-		A=A/mask;
-	
-		A=A[0:n1,0:n2,0:n3];
+		A=patchnd_inv(np.reshape(X,(X.shape[0],-1)).T,[n1,n2,n3],[l1,l2,l3],[s1,s2,s3],geom=geom);	#X may be (npatch,npix,1) as from patch3d
 	else:
 		#not written yet
 		pass;
 	return A
 
 
-def patch5d(A,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s5=2,mode=1):
+def patch5d(A,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s5=2,mode=1,geom=None):
 	"""
 	patch5d: decompose 4D/5D data into patches:
 	
 	INPUT
 	D: input image
 	mode: patching mode
+	geom: PatchGeometry (see patch_geometry) of these sizes, to skip the setup; optional
 	l1: first patch size
 	l2: second patch size
 	l3: third patch size
@@ -464,7 +576,7 @@ def patch5d(A,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s5=2,mode=1):
 	s5: fifth shifting size (when n5=1, l5=1, s5=0)
 	
 	OUTPUT
-	X: patches
+	X: patches (l1*l2*l3*l4*l5 x npatch), see patchnd
 	
 	HISTORY
 	by Yangkang Chen
@@ -478,50 +590,15 @@ def patch5d(A,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s5=2,mode=1):
 
 	"""
 
-	[n1,n2,n3,n4,n5]=A.shape;
-
-	if mode==1: 	#possible for other patching options
-	
-		tmp=np.mod(n1-l1,s1);
-		if tmp!=0:
-			A=np.concatenate((A,zeros(s1-tmp,n2,n3,n4,n5)),axis=0);
-	
-		tmp=np.mod(n2-l2,s2);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros(A.shape[0],s2-tmp,n3,n4,n5)),axis=1);
-	
-		tmp=np.mod(n3-l3,s3);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros(A.shape[0],A.shape[1],s3-tmp,n4,n5)),axis=2);	#concatenate along the third dimension
-	
-		tmp=np.mod(n4-l4,s4);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros(A.shape[0],A.shape[1],A.shape[2],s4-tmp,n5)),axis=3);	#concatenate along the forth dimension
-
-		tmp=np.mod(n5-l5,s5);
-		if tmp!=0:
-			A=np.concatenate((A,np.zeros(A.shape[0],A.shape[1],A.shape[2],A.shape[3],s5-tmp)),axis=4);	#concatenate along the fifth dimension  
-	
-		[N1,N2,N3,N4,N5]=A.shape;
-		X=np.array([]);
-		for i1 in range(0,N1-l1+1,s1):
-			for i2 in range(0,N2-l2+1,s2):
-				for i3 in range(0,N3-l3+1,s3):
-					for i4 in range(0,N4-l4+1,s4):
-						for i5 in range(0,N5-l5+1,s5):
-							tmp=np.reshape(A[i1:i1+l1,i2:i2+l2,i3:i3+l3,i4:i4+l4,i5:i5+l5],[l1*l2*l3*l4*l5,1],order='F');
-							X=np.concatenate((X,tmp),axis=1); #extremely slow, change it to X.append(tmp)
-	else:
-		#not written yet
-		pass;
+	X=patchnd(A,[l1,l2,l3,l4,l5],[s1,s2,s3,s4,s5],mode,geom);	#(l1*l2*l3*l4*l5,npatch)
 	return X
 
-def patch5d_inv( X,n1,n2,n3,n4,n5,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s5=2,mode=1):
+def patch5d_inv( X,n1,n2,n3,n4,n5,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s5=2,mode=1,geom=None):
 	"""
 	patch5d_inv: insert patches into the 4D/5D data
 	
 	INPUT
-	D: input image
+	X: input patches (l1*l2*l3*l4*l5 x npatch)
 	n1: first dimension size
 	n1: second dimension size
 	n3: third dimension size
@@ -538,9 +615,10 @@ def patch5d_inv( X,n1,n2,n3,n4,n5,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s
 	s4: fourth shifting size
 	s5: fifth shifting size (when n5=1, l5=1, s5=0)
 	mode: patching mode
+	geom: PatchGeometry (see patch_geometry) of these sizes, to skip the setup; optional
 	
 	OUTPUT
-	X: patches
+	A: 5D data (n1 x n2 x n3 x n4 x n5), see patchnd_inv
 	
 	HISTORY
 	by Yangkang Chen
@@ -555,60 +633,5 @@ def patch5d_inv( X,n1,n2,n3,n4,n5,l1=4,l2=4,l3=4,l4=4,l5=4,s1=2,s2=2,s3=2,s4=2,s
 
 	"""
 
-	if mode==1: 	#possible for other patching options
-		tmp1=np.mod(n1-l1,s1);
-		tmp2=np.mod(n2-l2,s2);
-		tmp3=np.mod(n3-l3,s3);
-		tmp4=np.mod(n4-l4,s4);
-		tmp5=np.mod(n5-l5,s5);
-	
-		if tmp1!=0 and tmp2!=0 and tmp3!=0 and tmp4!=0 and tmp5!=0:
-			A=zeros(n1+s1-tmp1,n2+s2-tmp2,n3+s3-tmp3,n4+s4-tmp4,n5+s5-tmp5);
-			mask=zeros(n1+s1-tmp1,n2+s2-tmp2,n3+s3-tmp3,n4+s4-tmp4,n5+s5-tmp5);
-
-	
-		if tmp1!=0 and tmp2==0 and tmp3==0 and tmp4==0 and tmp5==0:
-			A=zeros(n1+s1-tmp1,n2,n3,n4,n5);
-			mask=zeros(n1+s1-tmp1,n2,n3,n4,n5);
-
-	
-		if tmp1==0 and tmp2!=0 and tmp3==0 and tmp4==0 and tmp5==0:
-			A=zeros(n1,n2+s2-tmp2,n3,n4,n5);
-			mask=zeros(n1,n2+s2-tmp2,n3,n4,n5);
-
-	
-		if tmp1==0 and tmp2==0 and tmp3!=0 and tmp4==0 and tmp5==0:
-			A=zeros(n1,n2,n3+s3-tmp3,n4,n5);
-			mask=zeros(n1,n2,n3+s3-tmp3,n4,n5);
-
-
-		if tmp1==0 and tmp2==0 and tmp3==0 and tmp4!=0 and tmp5==0:
-			A=zeros(n1,n2,n3,n4+s4-tmp4,n5);
-			mask=zeros(n1,n2,n3,n4+s4-tmp4,n5);
-
-	
-		if tmp1==0 and tmp2==0 and tmp3==0 and tmp4==0 and tmp5!=0:
-			A=zeros(n1,n2,n3,n4,n5+s5-tmp5);
-			mask=zeros(n1,n2,n3,n4,n5+s5-tmp5);
-
-	
-		if tmp1==0 and tmp2==0  and tmp3==0 and tmp4==0 and tmp5==0:
-			A=zeros(n1,n2,n3,n4,n5);
-			mask=zeros(n1,n2,n3,n4,n5);
-
-
-		[N1,N2,N3,N4,N5]=A.shape;
-		id=-1;
-		for i1 in range(0,N1-l1+1,s1):
-			for i2 in range(0,N2-l2+1,s2):
-				for i3 in range(0,N3-l3+1,s3):
-					for i4 in range(0,N4-l4+1,s4):
-						for i5 in range(0,N5-l5+1,s5):
-							A[i1:i1+l1,i2:i2+l2,i3:i3+l3,i4:i4+l4,i5:i5+l5]=A[i1:i1+l1,i2:i2+l2,i3:i3+l3,i4:i4+l4,i5:i5+l5]+np.reshape(X[:,id],[l1,l2,l3,l4,l5],order='F');
-							mask[i1:i1+l1,i2:i2+l2,i3:i3+l3,i4:i4+l4,i5:i5+l5]=mask[i1:i1+l1,i2:i2+l2,i3:i3+l3,i4:i4+l4,i5:i5+l5]+np.ones([l1,l2,l3,l4,l5]);
-		A=A/mask;
-		A=A[0:n1,0:n2,0:n3,0:n4,0:n5];
-	else:
-		#not written yet
-		pass;
-	return A
\ No newline at end of file
+	A=patchnd_inv(X,[n1,n2,n3,n4,n5],[l1,l2,l3,l4,l5],[s1,s2,s3,s4,s5],mode,geom);
+	return A
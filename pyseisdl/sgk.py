@@ -12,11 +12,22 @@ def sgk(X,param):
 	  param.mode=1;   	#1: sparsity; 0: error
 	  param.niter=10; 	#number of SGK iterations to perform; default: 10
 	  param.D=DCT;    	#initial D
-	  param.T=3;      	#sparsity level
+	  param.T=3;      	#sparsity level (cap on the atoms per patch when mode=0; default: M)
+	  param.sigma=sigma;	#noise level for mode=0; default: estimated from X (see omp_eps)
+	  param.sparse=0;	#1: return G as a scipy.sparse CSC matrix; default: 0 (dense)
+	  param.n_jobs=1;	#processes for the sparse coding (-1: all cores); default: 1
+	  param.dtype=np.float32;	#floating type of X, D and G; default: as given
+	  param.tol=tol;		#stop early when the relative change of the error is below tol
+	  param.dtol=dtol;		#stop early when the relative change of D is below dtol
+	  param.history=0;	#1: also return the per-iteration history
+	  param.final_coding=1;	#0: skip the final coding of X with the learned D (G is None)
 	
 	OUTPUT
 	D:    learned dictionary
 	G:    sparse coefficients
+	hist: (only when param.history=1) hist['err']: relative representation
+	      error |X-DG|_F/|X|_F of each iteration, hist['dchange']: relative
+	      change of D in each iteration
 	
 	for X=DG
 	size of X: MxN
@@ -27,51 +38,106 @@ def sgk(X,param):
 	demos/test_pyseisdl_sgk3d.py
 	"""
 
-	T=param['T'];	#T=1; 	#requred by SGK
+	from .omp import omp_eps,omp_executor,dl_track
+	from .dictionary import dict_dense
 	niter=param['niter'];
 	mode=param['mode'];
+	if mode==1:
+		T=param['T'];	#T=1; 	#requred by SGK
+		eps=None;
+	else:
+		T=param['T'] if 'T' in param else X.shape[0];
+		eps=omp_eps(X,param);
 	if 'K' in param:
 		K=param['K'];
 	else:
 		K=param['D'].shape[1];	#dictionary size: number of atoms
 
-	D=param['D'][:,0:K].copy();
-
-	for iter in range(1,niter+1):
+	D=dict_dense(param['D'])[:,0:K].copy();	#a structured param.D (KronDict, SparseDict) is learned in dense form
+	if 'dtype' in param:	#e.g., np.float32 to keep X, D and G in single precision
+		X=X.astype(param['dtype'],copy=False);
+		D=D.astype(param['dtype'],copy=False);
+	pool,own=omp_executor(param);	#parallel sparse coding when param['n_jobs']>1
+	hist={'err':[],'dchange':[]};
+	xnrm=np.linalg.norm(X);
+	try:
+		for iter in range(1,niter+1):
 	
-		if mode==1:
-			G=ompN(D,X,1);
-			# exact form
-		else:
-			#error defined sparse coding
-			pass;
-			
-		for ik in range(0,K): 	#SGK iteration, K times means 
-			inds,=np.where(G[ik,:]!=0);
-			if inds.shape[0]!=0:		#empty array
-				D[:,ik]=np.sum(X[:,inds],1);	#better using a weighted summation ? NO, equivalent 
-				D[:,ik]=D[:,ik]/np.linalg.norm(D[:,ik]); 
+			if mode==1:
+				G,err=ompN(D,X,1,sparse=True,executor=pool,return_err=True);
+				# exact form
+			else:
+				#error defined sparse coding
+				G,err=ompN(D,X,T,eps,sparse=True,executor=pool,return_err=True);
+		
+			D0=D;
+			D=sgk_update(D,X,G);	#all K atoms at once
+			if dl_track(hist,D0,D,err,xnrm,param):
+				break;
 
-	# extra step
-	G=ompN(D,X,T);
+		# extra step
+		if 'final_coding' in param and not param['final_coding']:
+			G=None;		#D only, the caller codes the patches (e.g., chunk by chunk)
+		else:
+			G=ompN(D,X,T,eps,sparse=True,executor=pool);
+			if not ('sparse' in param and param['sparse']):
+				G=G.toarray();
+	finally:	#also on errors, so no worker processes are left running
+		if own:
+			pool.shutdown();
 
+	if 'history' in param and param['history']:
+		return D,G,hist
 	return D,G
 
-def ompN( D, X, K ):
+def sgk_update(D,X,G):
+	"""
+	sgk_update: SGK dictionary update of all atoms at once
+	
+	Each atom becomes the normalized sum of the patches that use it
+	(equation 8 in Chen, 2020, GJI), i.e., a column of X*S^T where S is the
+	binary support pattern of G; it is computed with one sparse-dense
+	product instead of a loop over the atoms. Unused atoms are kept.
+	
+	INPUT
+	D:     current dictionary (MxK)
+	X:     training samples (MxN)
+	G:     sparse coefficients (KxN), dense or scipy.sparse
+	
+	OUTPUT
+	D:     updated dictionary (MxK)
+	"""
+	import scipy.sparse
+	S=scipy.sparse.csr_matrix(G,copy=True);
+	S.data=(S.data!=0).astype(X.dtype);	#better using a weighted summation ? NO, equivalent 
+	S.eliminate_zeros();
+	
+	Dn=X@S.T;	#(MxK), sum of the patches using each atom
+	nrm=np.linalg.norm(Dn,axis=0);
+	used=nrm>0;
+	D=D.copy();
+	D[:,used]=Dn[:,used]/nrm[used];
+	return D
+
+def ompN( D, X, K, eps=None, sparse=False, executor=None, return_err=False ):
 	"""
 	multi-column sparse coding
 	BY Yangkang Chen
 	Jan, 2020
+	
+	K:   sparsity level (maximum number of atoms when eps is given)
+	eps: residual bound for error-constrained coding, optional
+	sparse: if True, return G as a scipy.sparse CSC matrix
+	executor: if given, code column blocks in parallel on it (see omp_shard)
+	return_err: if True, return G,err with err the squared residual norm of each column
 	"""
-	[n1,n2]=X.shape
-	[n1,n3]=D.shape
-	G=np.zeros([n3,n2]);
-	if K==1:
-		for i2 in range(0,n2):
-			G[:,i2]=omp_e(D,X[:,i2]);
+	from .omp import batch_omp,omp1,omp_shard
+	if executor is not None:
+		G=omp_shard(executor,D,X,K,eps,sparse,return_err=return_err);
+	elif K==1 and eps is None:
+		G=omp1(D,X,sparse=sparse,return_err=return_err);	#vectorized version of omp_e over all columns
 	else:
-		for i2 in range(0,n2):
-			G[:,i2]=omp0(D,X[:,i2],K);
+		G=batch_omp(D,X,K,eps=eps,sparse=sparse,return_err=return_err);	#all columns at once, see omp.py
 
 	return G
 
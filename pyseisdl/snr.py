@@ -25,8 +25,10 @@ def snr(g,f,mode=1):
 	if f.ndim==2:
 		f=np.expand_dims(f, axis=2)
 		
-	g = np.double(g); #in case of data format is unit8,12,16
-	f = np.double(f);
+	if not np.issubdtype(g.dtype,np.floating):
+		g = np.double(g); #in case of data format is unit8,12,16
+	if not np.issubdtype(f.dtype,np.floating):
+		f = np.double(f);
 
 	if f.size != g.size:
 		print('Dimesion of two images don''t match!');
@@ -0,0 +1,149 @@
+import numpy as np
+
+STORE_FORMAT=1	#version of the file layout written by store_save
+
+def store_key(shape,K,T,learner,survey=None):
+	"""
+	store_key: name of a dictionary in the store
+
+	INPUT
+	shape:   patch shape, e.g., [l1,l2] or [l1,l2,l3]
+	K:       number of atoms
+	T:       sparsity level
+	learner: 'sgk', 'ksvd', 'fast_ksvd', ...
+	survey:  optional survey/project name, so that different surveys with the
+	         same patch geometry keep separate dictionaries
+
+	OUTPUT
+	key:     e.g., 'survey1_l8x8x8_K64_T3_sgk'
+	"""
+	key='l'+'x'.join(str(int(li)) for li in shape)+'_K%d_T%d_%s'%(K,T,learner);
+	if survey is not None:
+		key=str(survey)+'_'+key;
+	return key
+
+def store_versions(path,key):
+	"""
+	store_versions: versions of a dictionary available in the store
+
+	INPUT
+	path:  store directory
+	key:   dictionary name (see store_key)
+
+	OUTPUT
+	vers:  sorted list of version numbers (empty if none)
+	"""
+	import os
+	import re
+
+	if not os.path.isdir(path):
+		return []
+	pat=re.compile(re.escape(key)+r'_v(\d+)\.npz$');
+	vers=[int(m.group(1)) for m in (pat.match(f) for f in os.listdir(path)) if m];
+	return sorted(vers)
+
+def store_save(path,key,D,meta=None):
+	"""
+	store_save: save a dictionary as a new version in the store
+	
+	The file is path/<key>_v<n>.npz with n one above the latest version. It
+	holds D and the metadata (a JSON string); it is written to a temporary
+	file first and then hard-linked to its name, which fails if the name
+	exists, so concurrent readers never see a partial file and concurrent
+	writers never overwrite each other (the later one takes the next
+	version).
+	
+	INPUT
+	path:  store directory (created if missing)
+	key:   dictionary name (see store_key)
+	D:     dictionary (MxK)
+	meta:  dict of JSON-serializable metadata (patch shape, K, T, learner,
+	       data fingerprint, ...)
+	
+	OUTPUT
+	ver:   version number that was written
+	"""
+	import os
+	import json
+	import time
+	import tempfile
+	
+	os.makedirs(path,exist_ok=True);
+	vers=store_versions(path,key);
+	ver=vers[-1]+1 if vers else 1;
+	meta=dict(meta) if meta is not None else {};
+	meta.update({'key':key,'format':STORE_FORMAT,'shape':list(D.shape),'time':time.strftime('%Y-%m-%dT%H:%M:%S')});
+	
+	while True:
+		meta['version']=ver;
+		fd,tmp=tempfile.mkstemp(suffix='.npz',dir=path);
+		try:
+			with os.fdopen(fd,'wb') as f:
+				np.savez(f,D=D,meta=np.array(json.dumps(meta)));
+			store_link(tmp,os.path.join(path,'%s_v%d.npz'%(key,ver)));
+			return ver
+		except FileExistsError:
+			ver=ver+1;	#taken by a concurrent writer
+		finally:
+			if os.path.exists(tmp):
+				os.remove(tmp);
+
+def store_link(src,dst):
+	"""
+	store_link: give the complete file src the name dst, failing with
+	FileExistsError if dst exists (hard link; exclusive creation and copy
+	where hard links are not supported)
+	"""
+	import os
+	import shutil
+	
+	try:
+		os.link(src,dst);
+	except FileExistsError:
+		raise
+	except OSError:
+		fd=os.open(dst,os.O_CREAT|os.O_EXCL|os.O_WRONLY);
+		with os.fdopen(fd,'wb') as f, open(src,'rb') as g:
+			shutil.copyfileobj(g,f);
+
+def store_load(path,key,version=None):
+	"""
+	store_load: load a dictionary from the store
+
+	INPUT
+	path:    store directory
+	key:     dictionary name (see store_key)
+	version: version to load; default: the latest
+
+	OUTPUT
+	D:       dictionary (MxK), None if not in the store
+	meta:    metadata dict (see store_save), None if not in the store
+	"""
+	import os
+	import json
+
+	if version is None:
+		vers=store_versions(path,key);
+		if not vers:
+			return None,None
+		version=vers[-1];
+	fname=os.path.join(path,'%s_v%d.npz'%(key,version));
+	if not os.path.isfile(fname):
+		return None,None
+	with np.load(fname) as f:
+		D=f['D'];
+		meta=json.loads(str(f['meta']));
+	return D,meta
+
+def data_fingerprint(X,ncol=1024):
+	"""
+	data_fingerprint: short hash of an array (shape, type and up to ncol
+	evenly spaced columns), kept in the metadata to tell which data a
+	dictionary was learned from; the cost does not grow with the data size
+	"""
+	import hashlib
+	
+	h=hashlib.sha1(str((X.shape,X.dtype.str)).encode());
+	Xs=X if X.ndim<2 or X.shape[1]<=ncol else X[:,np.linspace(0,X.shape[1]-1,ncol).astype(int)];
+	h.update(np.ascontiguousarray(Xs).view(np.uint8).ravel());
+	return h.hexdigest()[0:16]
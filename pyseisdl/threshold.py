@@ -17,8 +17,28 @@ def pthresh(x,sorh,t):
 	   M. Misiti, Y. Misiti, G. Oppenheim, J.M. Poggi 12-Mar-96. 
 	
 	   Yangkang Chen, The University of Texas at Austin
+	
+	   X can also be a scipy.sparse matrix (e.g., the coefficients from
+	   ompN(...,sparse=True)); only its stored entries are visited, and the
+	   percentiles count the implicit zeros, as for the dense matrix.
 	"""
 	import numpy as np
+	import scipy.sparse
+
+	thr=t;
+	if scipy.sparse.issparse(x):
+		y=x.copy();
+		if sorh=='ps' or sorh=='ph':
+			t=spercentile(np.abs(y.data),np.prod(y.shape),100-t);
+			thr=t;
+		if sorh=='s' or sorh=='ps':
+			y.data=np.sign(y.data)*np.maximum(np.abs(y.data)-t,0);
+		elif sorh=='h' or sorh=='ph':
+			y.data=y.data*(np.abs(y.data)>t);
+		else:
+			print('Invalid argument value.'); 
+		y.eliminate_zeros();
+		return y,thr
 
 	if sorh == 's':
 		tmp = (np.abs(x)-t); 
@@ -43,4 +63,24 @@ def pthresh(x,sorh,t):
 	else:
 		print('Invalid argument value.'); 
 
-	return y,thr
\ No newline at end of file
+	return y,thr
+
+def spercentile(a,n,q):
+	"""
+	spercentile: q-th percentile (numpy's linear interpolation) of n
+	values, of which a are the nonnegative stored ones and the other n-a.size
+	are zeros
+	
+	a: stored values (nonnegative)
+	n: total number of values
+	q: percentile in [0,100]
+	"""
+	import numpy as np
+	
+	nz=n-a.size;
+	h=q/100.0*(n-1);
+	lo=int(np.floor(h));hi=min(lo+1,n-1);
+	srt=np.sort(a);
+	vlo=srt[lo-nz] if lo>=nz else 0.0;
+	vhi=srt[hi-nz] if hi>=nz else 0.0;
+	return vlo+(h-lo)*(vhi-vlo)
@@ -0,0 +1,105 @@
+import numpy as np
+
+def tiled_denoise(din,mode,l,s,perc,param,tile,denoise=None,out=None):
+	"""
+	tiled_denoise: out-of-core 2D/3D denoising, block by block
+
+	The data (e.g., an np.memmap of a whole survey) is cut into tiles of size
+	tile, extended on every side by a halo of one patch length l. Each
+	extended tile is read, denoised on its own by the denoiser, and added
+	to the output with a taper: across each tile border the two
+	neighbouring tiles are blended by complementary linear ramps over the
+	2*halo samples around the border, which sum to one, so the output has
+	no seams. Peak memory is set by the tile size (the denoiser works on
+	one extended tile and its patch matrix at a time), not by the data size.
+	Each tile learns its own dictionary and thresholds its own coefficients
+	(perc is a percentage of the coefficients of the tile).
+
+	INPUT
+	  din:     input data (2D or 3D), an array or an np.memmap
+	  mode,l,s,perc: as in sgk_denoise
+	  param:   parameter struct of the denoiser; every tile gets its own copy
+	           (without param.geom, which depends on the tile size)
+	  tile:    tile (core) sizes [t1,t2(,t3)]; use t>=2*l
+	  denoise: sgk_denoise, ksvd_denoise, fast_ksvd_denoise or dct_denoise;
+	           default: sgk_denoise
+	  out:     output array (e.g., an np.memmap) of the size of din, or a file
+	           name for a new .npy memmap; default: a new array in memory
+
+	OUTPUT
+	  dout:    denoised data (out)
+
+	EXAMPLE
+	import numpy as np
+	from pyseisdl.tiled import tiled_denoise
+	din=np.load('survey.npy',mmap_mode='r')
+	dout=tiled_denoise(din,1,[4,4,4],[2,2,2],2,param,[200,100,100],out='survey_dn.npy')
+	"""
+	import itertools
+	from .denoise import sgk_denoise
+
+	if denoise is None:
+		denoise=sgk_denoise;
+	n=list(din.shape);
+	d=len(n);
+	tile=[min(int(tile[i]),n[i]) for i in range(0,d)];
+	halo=[min(int(l[i]),tile[i]//2) for i in range(0,d)];
+	dtype=param['dtype'] if 'dtype' in param else np.result_type(din.dtype,np.float32);
+
+	if out is None:
+		out=np.zeros(n,dtype=dtype);
+	elif isinstance(out,str):
+		out=np.lib.format.open_memmap(out,mode='w+',dtype=dtype,shape=tuple(n));	#zero-filled
+	else:
+		out[...]=0;
+
+	#per axis: windows (tile plus halo) and the blending weights of each window
+	wins=[tile_windows(n[i],tile[i],halo[i]) for i in range(0,d)];
+	for parts in itertools.product(*wins):
+		sl=tuple(p[0] for p in parts);
+		block=np.asarray(din[sl]);
+		par=dict(param);
+		par.pop('geom',None);
+		res=denoise(block,mode,l,s,perc,par);
+		dtile=res[0];
+		w=np.ones([1]*d);
+		for i,p in enumerate(parts):
+			w=w*np.reshape(p[1],[-1 if j==i else 1 for j in range(0,d)]);
+		out[sl]+=(dtile*w).astype(out.dtype,copy=False);
+
+	if isinstance(out,np.memmap):
+		out.flush();
+	return out
+
+def tile_windows(n,t,h):
+	"""
+	tile_windows: windows and blending weights of the tiles along one axis
+
+	Tile k covers [k*t,(k+1)*t) (the last one up to n), and its window
+	extends it by h on both sides. Around each inner border c=k*t the weight
+	of the left window goes down and the one of the right window goes up
+	linearly over [c-h,c+h), so the weights of all windows sum to one
+	everywhere.
+
+	INPUT
+	n:    axis length
+	t:    tile size
+	h:    halo (h<=t/2)
+
+	OUTPUT
+	wins: list of (slice,weights) of each window
+	"""
+	ramp=(np.arange(2*h)+0.5)/(2*h) if h>0 else np.zeros(0);	#0->1 over [c-h,c+h)
+	nt=max(n//t,1);		#the last tile also takes the remainder (t<=size<2t)
+	wins=[];
+	for k in range(0,nt):
+		a=k*t;b=min((k+1)*t,n);
+		i0=max(a-h,0) if k>0 else 0;
+		i1=min(b+h,n) if k<nt-1 else n;
+		w=np.ones(i1-i0);
+		if k>0:
+			w[0:2*h]=ramp;
+		if k<nt-1:
+			w[w.size-2*h:]=w[w.size-2*h:]*ramp[::-1];
+		wins.append((slice(i0,i1),w));
+	return wins